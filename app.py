@@ -4,12 +4,8 @@ from datetime import datetime
 
 # Import custom modules
 from modules.auth import load_auth_config, create_authenticator, handle_authentication, show_authentication_ui
-from modules.data_loader import load_data_from_url, load_data_from_upload
-from modules.utils import is_arabic, translate_text
-from modules.chat_explorer import show_chat_explorer
-from modules.search import show_keyword_search
-from modules.analytics import show_analytics_dashboard
-from modules.latency import show_latency_dashboard
+from modules.data_loader import show_data_source_selection, show_data_info
+# Tab modules (plotly, translation) are imported inside their tabs, after login succeeds
 
 def main():
     st.set_page_config(page_title="Layla Conversation Analyzer", layout="wide")
@@ -43,84 +39,35 @@ def main():
 
     # Data source selection
     st.divider()
-    st.subheader("📊 Data Source")
-    
-    data_source = st.radio(
-        "Choose your data source:",
-        ["Use Cloud Database", "Upload CSV File"],
-        horizontal=True,
-        help="Select whether to use the pre-configured cloud database or upload your own CSV file"
-    )
-    
-    df = None
-    
-    if data_source == "Use Cloud Database":
-        # Create a placeholder for loading message
-        loading_placeholder = st.empty()
-        loading_placeholder.info("🔄 Loading conversation data from cloud database...")
-        
-        df = load_data_from_url()
-        
-        if df is None:
-            loading_placeholder.empty()  # Clear loading message
-            st.error("❌ Failed to load conversation data from cloud database.")
-            st.stop()
-        
-        loading_placeholder.empty()  # Clear loading message
-        st.success(f"✅ Successfully loaded {len(df)} conversation records from cloud database!")
-        
-    else:  # Upload CSV File
-        st.info("📁 Please upload your conversation data CSV file")
-        uploaded_file = st.file_uploader(
-            "Choose a CSV file",
-            type="csv",
-            help="Upload a CSV file with columns: thread_id, timestamp, role, message, region"
-        )
-        
-        if uploaded_file is not None:
-            df = load_data_from_upload(uploaded_file)
-            if df is not None:
-                st.success(f"✅ Successfully loaded {len(df)} conversation records from uploaded file!")
-            else:
-                st.stop()
-        else:
-            st.warning("⚠️ Please upload a CSV file to continue.")
-            st.stop()
+    df = show_data_source_selection()
     
     # Display data info
-    if df is not None:
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            st.metric("Total Records", len(df))
-        with col2:
-            st.metric("Unique Conversations", df['thread_id'].nunique())
-        with col3:
-            # Format dates as "Jul 2 - Jul 29" to save space (chronological order)
-            # Calculate from original data before any filtering
-            original_min_date = df['timestamp'].min()
-            original_max_date = df['timestamp'].max()
-            min_date_str = original_min_date.strftime('%b %d')
-            max_date_str = original_max_date.strftime('%b %d')
-            st.metric("Date Range", f"{min_date_str} - {max_date_str}")
+    show_data_info(df)
 
     # Filter by launch date (July 1, 2025) to latest
     min_date = pd.to_datetime('2025-07-01')
     max_date = df['timestamp'].max().normalize()
-    df = df[df['timestamp'] >= min_date]
+    # Timestamps are sorted at load, so the cut is a binary search rather than a full-length mask;
+    # it stops at the first missing timestamp (sorted last), which >= never matched either
+    df = df.iloc[df['timestamp'].searchsorted(min_date):df['timestamp'].searchsorted(pd.NaT)]
 
     # Create tabs for different sections
     tab1, tab2, tab3, tab4 = st.tabs(["Analytics Dashboard", "Chat Explorer", "Keyword Search", "Response Latency"]) 
 
     with tab1:
+        from modules.analytics import show_analytics_dashboard
         show_analytics_dashboard(df)
 
     with tab2:
+        from modules.chat_explorer import show_chat_explorer
         show_chat_explorer(df)
 
     with tab3:
+        from modules.search import show_keyword_search
         show_keyword_search(df)
 
     with tab4:
+        from modules.latency import show_latency_dashboard
         show_latency_dashboard(df)
 
 if __name__ == "__main__":
@@ -3,8 +3,9 @@ Analytics functions for the Layla Conversation Analyzer
 """
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
-from .utils import is_arabic, categorize_opening_message
+from .utils import categorize_opening_messages, df_fingerprint, day_range_slice, category_mask, KEYWORD_BITS, OPENING_CATEGORIES
 
 def show_analytics_dashboard(df):
     """Display the complete analytics dashboard"""
@@ -28,16 +29,17 @@ def show_analytics_dashboard(df):
     # Validate date range selection
     start_date, end_date = validate_date_range(analytics_date_filter)
     
-    # Apply date filter to analytics data
-    analytics_df = df[
-        (df['timestamp'].dt.date >= start_date) & 
-        (df['timestamp'].dt.date <= end_date)
-    ].copy()
+    # Apply date filter to analytics data: a zero-copy slice of the time-ordered frame
+    analytics_df = day_range_slice(df, start_date, end_date)
+    
+    # Compute all aggregates once; the info line and every section read from the same dict
+    metrics = calculate_metrics(analytics_df) if len(analytics_df) else None
     
     # Show filtered data info
     if len(analytics_df) != len(df):
+        filtered_conversations = metrics['total_conversations'] if metrics else 0
         st.info(f"📊 Showing analytics for {start_date} to {end_date} | "
-               f"Filtered: {len(analytics_df):,} messages from {analytics_df['thread_id'].nunique():,} conversations "
+               f"Filtered: {len(analytics_df):,} messages from {filtered_conversations:,} conversations "
                f"(Original: {len(df):,} messages from {df['thread_id'].nunique():,} conversations)")
     
     # Check if filtered data is empty
@@ -48,11 +50,11 @@ def show_analytics_dashboard(df):
     st.divider()
 
     # Display all analytics sections
-    show_key_metrics(analytics_df)
+    show_key_metrics(metrics)
     show_opening_categories_analysis(analytics_df)
-    show_conversation_length_analysis(analytics_df)
-    show_daily_analytics(analytics_df)
-    show_region_distribution(analytics_df)
+    show_conversation_length_analysis(metrics)
+    show_daily_analytics(metrics)
+    show_region_distribution(metrics)
 
 def validate_date_range(analytics_date_filter):
     """Validate and extract start and end dates from date input"""
@@ -72,28 +74,51 @@ def validate_date_range(analytics_date_filter):
     
     return start_date, end_date
 
+@st.cache_data(show_spinner=False, max_entries=8, hash_funcs={pd.DataFrame: df_fingerprint})
 def calculate_metrics(analytics_df):
-    """Calculate all key metrics from the analytics dataframe"""
-    total_conversations = analytics_df['thread_id'].nunique()
+    """Calculate all key metrics and chart aggregates from the analytics dataframe"""
+    # One pass over the thread_id codes serves the conversation count and the length distribution.
+    # value_counts on the categorical bincounts its codes and comes back longest-first; threads
+    # outside the filtered range show up as zero counts and are dropped.
+    conv_lengths = analytics_df['thread_id'].value_counts()
+    conv_lengths = conv_lengths[conv_lengths > 0].rename(None)
+    total_conversations = len(conv_lengths)
     total_messages = len(analytics_df)
-    user_messages = len(analytics_df[analytics_df['role'] == 'user'])
-    assistant_messages = len(analytics_df[analytics_df['role'] == 'assistant'])
-    arabic_messages = analytics_df['message'].apply(is_arabic).sum()
-    english_messages = (~analytics_df['message'].apply(is_arabic)).sum()
+    # One bincount over the role codes instead of materializing a filtered frame per role
+    role_counts = analytics_df['role'].value_counts()
+    user_messages = int(role_counts.get('user', 0))
+    assistant_messages = int(role_counts.get('assistant', 0))
+    arabic_messages = analytics_df['is_arabic'].sum()
+    english_messages = (~analytics_df['is_arabic']).sum()
     
-    conv_lengths = analytics_df.groupby('thread_id').size()
     conv_gt6 = (conv_lengths > 6).sum()
     conv_le2 = (conv_lengths <= 2).sum()
     
-    long_user_prompts = analytics_df[(analytics_df['role'] == 'user') & (analytics_df['message'].str.split().str.len() > 30)]
-    empty_assistant = analytics_df[(analytics_df['role'] == 'assistant') & (analytics_df['message'].str.strip() == '')]
-    error_msgs = analytics_df['message'].str.contains('error|failed|exception|problem|issue', case=False, na=False).sum()
-    happy_msgs = analytics_df['message'].str.contains('thank|great|awesome|perfect|amazing|love|happy|helpful|👍', case=False, na=False).sum()
-    frustrated_msgs = analytics_df['message'].str.contains('not working|bad|hate|angry|frustrated|annoy|useless|waste|problem|issue|disappoint|😡|😠|👎', case=False, na=False).sum()
+    # Word counts and blank flags are precomputed at load; only the scalars are kept
+    long_user_prompts = int((category_mask(analytics_df['role'], 'user') &
+                             (analytics_df['word_count'].to_numpy() > 30)).sum())
+    empty_assistant = int((category_mask(analytics_df['role'], 'assistant') &
+                           analytics_df['is_blank'].to_numpy()).sum())
+    # Keyword classes were matched once at load; only their bits are counted here
+    keyword_bits = analytics_df['keyword_bits'].to_numpy()
+    error_msgs = int(np.count_nonzero(keyword_bits & KEYWORD_BITS['error']))
+    happy_msgs = int(np.count_nonzero(keyword_bits & KEYWORD_BITS['happy']))
+    frustrated_msgs = int(np.count_nonzero(keyword_bits & KEYWORD_BITS['frustrated']))
     
     avg_len = conv_lengths.mean() if len(conv_lengths) > 0 else 0
     median_len = conv_lengths.median() if len(conv_lengths) > 0 else 0
 
+    # One groupby over the full frame: message counts per (day, thread, region). The daily and
+    # regional series are then reduced from this much smaller frame instead of rescanning every message.
+    # Keep missing keys here (dropna=False) so rows without a region still count per day; the
+    # reductions below drop them per series, as the separate groupbys did.
+    thread_activity = (analytics_df.groupby(['day', 'thread_id', 'region'], observed=True, dropna=False)
+                       .size().rename('messages').reset_index())
+    daily = thread_activity.groupby('day').agg(thread_id=('thread_id', 'nunique'), messages=('messages', 'sum')).reset_index()
+    chats_per_day = daily[['day', 'thread_id']]
+    msgs_per_day = daily[['day', 'messages']]
+    region_counts = thread_activity.groupby('region', observed=True)['thread_id'].nunique().reset_index()
+
     return {
         'total_conversations': total_conversations,
         'total_messages': total_messages,
@@ -110,13 +135,14 @@ def calculate_metrics(analytics_df):
         'frustrated_msgs': frustrated_msgs,
         'avg_len': avg_len,
         'median_len': median_len,
-        'conv_lengths': conv_lengths
+        'conv_lengths': conv_lengths,
+        'chats_per_day': chats_per_day,
+        'msgs_per_day': msgs_per_day,
+        'region_counts': region_counts
     }
 
-def show_key_metrics(analytics_df):
+def show_key_metrics(metrics):
     """Display key metrics section"""
-    metrics = calculate_metrics(analytics_df)
-    
     st.markdown("""
     <style>
     .metric-box {
@@ -146,7 +172,7 @@ def show_key_metrics(analytics_df):
         ("User Messages", metrics['user_messages'], "Assistant Replies", metrics['assistant_messages']),
         ("Arabic Messages", metrics['arabic_messages'], "English Messages", metrics['english_messages']),
         (">6 Message Conversations", metrics['conv_gt6'], "≤2 Message Conversations", metrics['conv_le2']),
-        ("Empty Assistant Responses", len(metrics['empty_assistant']), "Error Messages", metrics['error_msgs']),
+        ("Empty Assistant Responses", metrics['empty_assistant'], "Error Messages", metrics['error_msgs']),
         ("Happy User Messages", metrics['happy_msgs'], "Frustrated User Messages", metrics['frustrated_msgs']),
         ("Average Messages/Chat", f"{metrics['avg_len']:.2f}", "Median Messages/Chat", f"{metrics['median_len']:.0f}"),
     ]
@@ -159,79 +185,79 @@ def show_key_metrics(analytics_df):
             st.markdown(f"<div class='metric-box'><div class='metric-title'>{right_label}</div><div class='metric-value'>{right_val}</div></div>", unsafe_allow_html=True)
     
     # Additional: Long user prompts
-    st.markdown(f"<div class='metric-box'><div class='metric-title'>Long User Prompts (&gt;30 words)</div><div class='metric-value'>{len(metrics['long_user_prompts'])}</div></div>", unsafe_allow_html=True)
+    st.markdown(f"<div class='metric-box'><div class='metric-title'>Long User Prompts (&gt;30 words)</div><div class='metric-value'>{metrics['long_user_prompts']}</div></div>", unsafe_allow_html=True)
 
-def show_opening_categories_analysis(analytics_df):
-    """Display conversation opening categories analysis"""
-    st.subheader("📝 Conversation Opening Categories")
+@st.cache_data(show_spinner=False, max_entries=8, hash_funcs={pd.DataFrame: df_fingerprint})
+def calculate_opening_categories(analytics_df):
+    """Per-category conversation counts and week-over-week deltas (memoized like calculate_metrics)"""
+    # First user row of each conversation (reused below for the WoW deltas). The frame is kept in
+    # time order at load, so these are hashed distincts over the user rows, no sort or groupby.
+    # Like groupby().first(), the timestamp comes from the first user row and the message from the
+    # first non-empty one; threads whose user messages are all empty open as 'Others'.
+    user_df = analytics_df.loc[category_mask(analytics_df['role'], 'user'), ['thread_id', 'message', 'timestamp']]
+    first_user_messages = user_df[['thread_id', 'timestamp']].drop_duplicates(subset='thread_id', ignore_index=True)
+    opening_messages = user_df.loc[user_df['message'].notna(), ['thread_id', 'message']].drop_duplicates(subset='thread_id')
     
-    # Get unique conversations and their opening categories - fixed to avoid pandas warning
-    conversations = analytics_df.groupby('thread_id').first().reset_index()
+    # Categorize the opening messages column-wise; as a categorical over the fixed labels,
+    # the counts below work on small integer codes
+    opening_messages['category'] = categorize_opening_messages(opening_messages['message'])
+    first_user_messages = first_user_messages.merge(opening_messages[['thread_id', 'category']], on='thread_id', how='left')
+    first_user_messages['category'] = first_user_messages['category'].fillna('Others')
     
-    # Get first user message for each conversation to categorize - optimized approach
-    # Extract the first user message for each thread_id
-    first_user_messages = (
-        analytics_df[analytics_df['role'] == 'user']
-        .sort_values('timestamp')
-        .groupby('thread_id')
-        .first()
-        .reset_index()
-    )
-    
-    # Categorize the opening messages
-    first_user_messages['category'] = first_user_messages['message'].apply(categorize_opening_message)
-    
-    # Merge categories back with conversations
-    category_df = conversations.merge(
-        first_user_messages[['thread_id', 'category']],
-        on='thread_id',
-        how='left'
-    ).fillna({'category': 'Others'})
-    
-    # Count conversations by category (for the currently filtered date range)
-    category_counts = category_df['category'].value_counts().reset_index()
+    # Count conversations by category (for the currently filtered date range) straight from the
+    # openings; conversations without any user message count as 'Others'
+    total_conversations = analytics_df['thread_id'].nunique()
+    category_counts = first_user_messages['category'].value_counts()
+    category_counts['Others'] += total_conversations - len(first_user_messages)
+    # (value_counts on a categorical also lists unused labels; keep only categories that occur)
+    category_counts = category_counts[category_counts > 0].sort_values(ascending=False, kind='stable').reset_index()
     category_counts.columns = ['Category', 'Count']
+    category_counts['Category'] = category_counts['Category'].astype(str)
     
     # Calculate percentages
-    total_conversations = len(category_df)
     category_counts['Percentage'] = (category_counts['Count'] / total_conversations * 100).round(1)
     
     # Compute Week-over-Week absolute deltas by category using first user message timestamp per thread,
     # anchored to the end of the selected date range and computed within the currently filtered data.
     try:
-        # Use the currently filtered analytics_df as the base
-        base_df = analytics_df.copy()
-        # Extract first user message per thread with timestamp within the filtered range
-        first_users_all = (
-            base_df[base_df['role'] == 'user']
-            .sort_values('timestamp')
-            .groupby('thread_id')
-            .first()
-            .reset_index()[['thread_id', 'message', 'timestamp']]
-        )
-        first_users_all['category'] = first_users_all['message'].apply(categorize_opening_message)
+        # Same per-thread first user messages (already categorized) as above. They keep the frame's
+        # time order, so each window is a contiguous slice found by binary search.
+        opening_ts = first_user_messages['timestamp']
+        valid = opening_ts.notna().to_numpy()
+        opening_ts = opening_ts[valid]
+        codes = first_user_messages['category'].cat.codes.to_numpy()[valid]
         # Define windows relative to the end of the selected date range
-        end_ts = base_df['timestamp'].max()
+        end_ts = analytics_df['timestamp'].max()
         curr_start = end_ts - pd.Timedelta(days=7)
         prev_start = end_ts - pd.Timedelta(days=14)
-        curr_mask = first_users_all['timestamp'] > curr_start
-        prev_mask = (first_users_all['timestamp'] > prev_start) & (first_users_all['timestamp'] <= curr_start)
-        curr_counts = first_users_all.loc[curr_mask, 'category'].value_counts()
-        prev_counts = first_users_all.loc[prev_mask, 'category'].value_counts()
-        wow_delta_counts = (curr_counts - prev_counts).to_dict()
+        i_prev, i_curr, i_end = opening_ts.searchsorted([prev_start, curr_start, end_ts], side='right')
+        curr_counts = np.bincount(codes[i_curr:i_end], minlength=len(OPENING_CATEGORIES))
+        prev_counts = np.bincount(codes[i_prev:i_curr], minlength=len(OPENING_CATEGORIES))
+        # Only categories seen in both windows get a delta
+        wow_delta_counts = {
+            category: int(curr - prev)
+            for category, curr, prev in zip(OPENING_CATEGORIES, curr_counts, prev_counts)
+            if curr and prev
+        }
     except Exception:
         wow_delta_counts = {}
 
+    return category_counts, wow_delta_counts
+
+def show_opening_categories_analysis(analytics_df):
+    """Display conversation opening categories analysis"""
+    st.subheader("📝 Conversation Opening Categories")
+    
+    category_counts, wow_delta_counts = calculate_opening_categories(analytics_df)
+
     # Display metrics
-    col1, col2, col3, col4 = st.columns(4)
-    categories = ['Fragrance Help', 'Skincare Routine', 'Product Summarization', 'Others']
-    cols = [col1, col2, col3, col4]
+    cols = st.columns(len(OPENING_CATEGORIES))
+    # One lookup table by label instead of filtering the counts frame twice per category
+    by_category = category_counts.set_index('Category').reindex(OPENING_CATEGORIES, fill_value=0)
     
-    for i, category in enumerate(categories):
-        count = category_counts[category_counts['Category'] == category]['Count'].values
-        count = count[0] if len(count) > 0 else 0
-        percentage = category_counts[category_counts['Category'] == category]['Percentage'].values
-        percentage = percentage[0] if len(percentage) > 0 else 0
+    for i, category in enumerate(OPENING_CATEGORIES):
+        count = by_category.at[category, 'Count']
+        percentage = by_category.at[category, 'Percentage']
         
         with cols[i]:
             delta_val = wow_delta_counts.get(category, None)
@@ -251,30 +277,11 @@ def show_opening_categories_analysis(analytics_df):
     
     with col1:
         # Pie chart
-        fig_pie = px.pie(
-            category_counts, 
-            values='Count', 
-            names='Category',
-            title='Distribution of Conversation Opening Categories',
-            color_discrete_sequence=px.colors.qualitative.Set3
-        )
-        st.plotly_chart(fig_pie, use_container_width=True)
+        st.plotly_chart(_make_opening_pie(category_counts), use_container_width=True)
     
     with col2:
         # Bar chart
-        fig_bar = px.bar(
-            category_counts.sort_values('Count', ascending=True), 
-            x='Count', 
-            y='Category',
-            orientation='h',
-            title='Conversations by Opening Category',
-            text='Count',
-            color='Category',
-            color_discrete_sequence=px.colors.qualitative.Set3
-        )
-        fig_bar.update_traces(texttemplate='%{text}', textposition='outside')
-        fig_bar.update_layout(showlegend=False)
-        st.plotly_chart(fig_bar, use_container_width=True)
+        st.plotly_chart(_make_opening_bar(category_counts), use_container_width=True)
     
     # Detailed breakdown table
     st.markdown("**Detailed Breakdown:**")
@@ -284,36 +291,80 @@ def show_opening_categories_analysis(analytics_df):
     st.dataframe(display_df, use_container_width=True, hide_index=True)
 
 
-def show_conversation_length_analysis(analytics_df):
+def show_conversation_length_analysis(metrics):
     """Display conversation length analysis section"""
-    metrics = calculate_metrics(analytics_df)
     conv_lengths = metrics['conv_lengths']
     
     # Histogram
-    fig_hist = px.histogram(conv_lengths, nbins=20, title='Distribution of Conversation Lengths', labels={'value':'Messages per Conversation'})
-    st.plotly_chart(fig_hist, use_container_width=True)
+    st.plotly_chart(_make_length_histogram(conv_lengths), use_container_width=True)
     
     # Show top 10 longest conversations
     st.subheader("Top 10 Longest Conversations")
-    st.dataframe(conv_lengths.sort_values(ascending=False).head(10).reset_index().rename(columns={0:'Messages'}), use_container_width=True)
+    st.dataframe(conv_lengths.head(10).reset_index().rename(columns={0:'Messages'}), use_container_width=True)
 
-def show_daily_analytics(analytics_df):
+def show_daily_analytics(metrics):
     """Display daily analytics charts"""
     # Chats per day
-    chats_per_day = analytics_df.groupby(analytics_df['timestamp'].dt.date)['thread_id'].nunique().reset_index()
-    fig1 = px.bar(chats_per_day, x='timestamp', y='thread_id', labels={'timestamp':'Date', 'thread_id':'Conversations'}, title='New Conversations per Day')
-    st.plotly_chart(fig1, use_container_width=True)
+    st.plotly_chart(_make_chats_per_day_chart(metrics['chats_per_day']), use_container_width=True)
     
     # Messages per day
-    msgs_per_day = analytics_df.groupby(analytics_df['timestamp'].dt.date).size().reset_index(name='messages')
-    fig_msgs = px.line(msgs_per_day, x='timestamp', y='messages', title='Messages Sent per Day')
-    st.plotly_chart(fig_msgs, use_container_width=True)
+    st.plotly_chart(_make_msgs_per_day_chart(metrics['msgs_per_day']), use_container_width=True)
 
-def show_region_distribution(analytics_df):
+def show_region_distribution(metrics):
     """Display region distribution charts"""
     # Region distribution
-    region_counts = analytics_df.groupby('region')['thread_id'].nunique().reset_index()
-    fig2 = px.pie(region_counts, names='region', values='thread_id', title='Conversations by Region')
-    st.plotly_chart(fig2, use_container_width=True)
+    region_counts = metrics['region_counts']
+    st.plotly_chart(_make_region_pie(region_counts), use_container_width=True)
     st.markdown("**Conversations by Region (Table):**")
     st.dataframe(region_counts.rename(columns={'thread_id': 'Conversations'}), use_container_width=True)
+
+# Figure builders are cached on the small pre-aggregated inputs, so unchanged
+# charts are not rebuilt on every rerun
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _make_length_histogram(conv_lengths):
+    """Histogram of messages per conversation"""
+    return px.histogram(conv_lengths, nbins=20, title='Distribution of Conversation Lengths', labels={'value':'Messages per Conversation'})
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _make_chats_per_day_chart(chats_per_day):
+    """Bar chart of conversations per day"""
+    return px.bar(chats_per_day, x='day', y='thread_id', labels={'day':'Date', 'thread_id':'Conversations'}, title='New Conversations per Day')
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _make_msgs_per_day_chart(msgs_per_day):
+    """Line chart of messages per day"""
+    return px.line(msgs_per_day, x='day', y='messages', labels={'day':'Date'}, title='Messages Sent per Day')
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _make_region_pie(region_counts):
+    """Pie chart of conversations by region"""
+    return px.pie(region_counts, names='region', values='thread_id', title='Conversations by Region')
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _make_opening_pie(category_counts):
+    """Pie chart of conversations by opening category"""
+    return px.pie(
+        category_counts, 
+        values='Count', 
+        names='Category',
+        title='Distribution of Conversation Opening Categories',
+        color_discrete_sequence=px.colors.qualitative.Set3
+    )
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _make_opening_bar(category_counts):
+    """Horizontal bar chart of conversations by opening category"""
+    fig_bar = px.bar(
+        category_counts.sort_values('Count', ascending=True), 
+        x='Count', 
+        y='Category',
+        orientation='h',
+        title='Conversations by Opening Category',
+        text='Count',
+        color='Category',
+        color_discrete_sequence=px.colors.qualitative.Set3
+    )
+    fig_bar.update_traces(texttemplate='%{text}', textposition='outside')
+    fig_bar.update_layout(showlegend=False)
+    return fig_bar
@@ -1,18 +1,31 @@
 """
 Authentication functions for the Layla Conversation Analyzer
 """
+import os
 import streamlit as st
 import streamlit_authenticator as stauth
 import yaml
-from yaml.loader import SafeLoader
+
+# libyaml's C parser when PyYAML was built with it, the pure-Python one otherwise
+YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+# Authentication configuration file, relative to the app directory
+CONFIG_PATH = 'config.yaml'
 
 def load_auth_config():
-    """Load authentication configuration from config.yaml"""
-    with open('config.yaml') as file:
-        return yaml.load(file, Loader=SafeLoader)
+    """Load authentication configuration from config.yaml (re-parsed only when the file changes)"""
+    return _parse_auth_config(CONFIG_PATH, os.path.getmtime(CONFIG_PATH))
+
+@st.cache_data(show_spinner=False, max_entries=1)
+def _parse_auth_config(path, mtime):
+    """Parse the config once per file version; st.cache_data hands each caller its own copy,
+    since the authenticator mutates the credentials it is given"""
+    with open(path) as file:
+        return yaml.load(file, Loader=YAML_LOADER)
 
 def create_authenticator(config):
-    """Create authenticator object with enhanced security"""
+    """Create authenticator object with enhanced security.
+    Built on every run: it renders the cookie component and seeds per-session state."""
     return stauth.Authenticate(
         config['credentials'],
         config['cookie']['name'],
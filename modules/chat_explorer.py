@@ -3,10 +3,320 @@ Chat Explorer functionality for the Layla Conversation Analyzer
 """
 import streamlit as st
 import pandas as pd
+import numpy as np
+import functools
 import json
 import re
 from datetime import datetime
-from .utils import is_arabic, translate_text, categorize_opening_message
+from .utils import is_arabic, translate_batch, categorize_opening_message, categorize_opening_messages, day_range_mask, category_mask, df_fingerprint, OPENING_CATEGORIES
+
+# A complete HH:MM time in the time filter box (matches exactly one label)
+FULL_TIME_RE = re.compile(r'\d{2}:\d{2}')
+
+# How many conversations the selectbox lists at a time
+CHAT_OPTIONS_PAGE = 500
+
+# Fallback extraction from assistant replies that aren't valid JSON, tried in order
+PRIMARY_ID_RES = [
+    re.compile(r'"primary_id":\s*"([^"]+)"', re.IGNORECASE),
+    re.compile(r'"primary_id":"([^"]+)"', re.IGNORECASE),
+    re.compile(r'primary_id["\']?\s*:\s*["\']([^"\']+)["\']', re.IGNORECASE),
+]
+RESPONSE_TEXT_RES = [
+    re.compile(r'"response_text":\s*"(.*?)"(?=\s*[,}])', re.DOTALL | re.IGNORECASE),
+    re.compile(r'"response_text":"(.*?)"(?=,"|\})', re.DOTALL | re.IGNORECASE),
+    re.compile(r'response_text["\']?\s*:\s*["\']([^"\']*)["\']', re.DOTALL | re.IGNORECASE),
+]
+
+# Markdown-to-HTML rewrites applied by _clean_message_text, compiled once
+BOLD_RE = re.compile(r'\*\*(.*?)\*\*')
+HEADER_RE = re.compile(r'### (.*?)(<br>|$)')
+BOLD_BULLET_RE = re.compile(r'- \*\*(.*?)\*\*')
+LINE_BULLET_RE = re.compile(r'^- (.*?)$', re.MULTILINE)
+BR_BULLET_RE = re.compile(r'<br>- (.*?)(<br>|$)')
+FAQ_RE = re.compile(r'FAQs?:\s*<br>', re.IGNORECASE)
+WHITESPACE_RE = re.compile(r'\s+')
+REPEATED_BR_RE = re.compile(r'(<br>\s*){3,}')
+
+# Chat bubble styles for the conversation view. Comments and indentation are stripped once at
+# import, so each rerun ships the stylesheet as one compact line.
+CHAT_CSS = re.sub(r'\s+', ' ', re.sub(r'/\*.*?\*/', '', """
+<style>
+/* CSS Variables for light/dark mode support */
+:root {
+    --background-color: white;
+    --text-color: #333;
+    --secondary-text-color: #666;
+    --border-color: #e0e0e0;
+    --code-background: #f5f5f5;
+    --code-text: #2d3748;
+    --code-border: #e2e8f0;
+}
+
+/* Dark mode detection using Streamlit's theme */
+@media (prefers-color-scheme: dark) {
+    :root {
+        --background-color: #262730;
+        --text-color: #fafafa;
+        --secondary-text-color: #a0a0a0;
+        --border-color: #404040;
+        --code-background: #1e1e1e;
+        --code-text: #e2e8f0;
+        --code-border: #404040;
+    }
+}
+
+/* Streamlit dark mode override */
+[data-theme="dark"] {
+    --background-color: #262730;
+    --text-color: #fafafa;
+    --secondary-text-color: #a0a0a0;
+    --border-color: #404040;
+    --code-background: #1e1e1e;
+    --code-text: #e2e8f0;
+    --code-border: #404040;
+}
+
+.user-message {
+    background: #007bff;
+    color: white;
+    padding: 15px 20px;
+    border-radius: 20px 20px 5px 20px;
+    margin: 10px 0 10px 50px;
+    box-shadow: 0 2px 10px rgba(0, 123, 255, 0.2);
+    position: relative;
+    max-width: 100%;
+    word-wrap: break-word;
+}
+
+.assistant-message {
+    background: #f1f3f4;
+    color: #333;
+    padding: 15px 20px;
+    border-radius: 20px 20px 20px 5px;
+    margin: 10px 50px 10px 0;
+    box-shadow: 0 2px 10px rgba(0, 0, 0, 0.1);
+    position: relative;
+    max-width: 80%;
+    word-wrap: break-word;
+    border: 1px solid #e0e0e0;
+}
+
+.message-time {
+    font-size: 11px;
+    opacity: 0.7;
+    margin-bottom: 8px;
+    font-weight: 500;
+    letter-spacing: 0.5px;
+}
+
+.assistant-message .message-time {
+    color: #666;
+}
+
+.user-message .message-time {
+    color: rgba(255, 255, 255, 0.9);
+}
+
+.message-content {
+    line-height: 1.6;
+    font-size: 14px;
+    font-weight: 400;
+}
+
+.translate-btn {
+    background: rgba(0, 123, 255, 0.1);
+    border: 1px solid rgba(0, 123, 255, 0.3);
+    color: #007bff;
+    padding: 6px 12px;
+    border-radius: 16px;
+    font-size: 11px;
+    margin-top: 10px;
+    cursor: pointer;
+    transition: all 0.2s ease;
+}
+
+.translate-btn:hover {
+    background: rgba(0, 123, 255, 0.2);
+    transform: translateY(-1px);
+}
+
+.translation {
+    background: #f8f9fa;
+    border-radius: 10px;
+    padding: 10px 14px;
+    margin-top: 10px;
+    font-style: italic;
+    border-left: 4px solid #007bff;
+    font-size: 13px;
+    line-height: 1.5;
+    color: #333;
+}
+
+.conversation-header {
+    background: linear-gradient(90deg, #667eea 0%, #764ba2 100%);
+    color: white;
+    padding: 15px 20px;
+    border-radius: 15px;
+    margin-bottom: 20px;
+    box-shadow: 0 4px 20px rgba(102, 126, 234, 0.3);
+}
+
+.conversation-title {
+    font-size: 18px;
+    font-weight: 600;
+    margin: 0;
+}
+
+.conversation-meta {
+    font-size: 15px;
+    opacity: 0.9;
+    margin-top: 5px;
+}
+
+.product-recommendations {
+    margin: 15px 50px 15px 0;
+    background: linear-gradient(135deg, #f8f9fb 0%, #f1f4f8 100%);
+    border: 1px solid #e2e8f0;
+    border-radius: 12px;
+    padding: 16px;
+    box-shadow: 0 2px 12px rgba(0,0,0,0.08);
+}
+
+.product-recommendations-header {
+    display: flex;
+    align-items: center;
+    margin-bottom: 12px;
+    padding-bottom: 8px;
+    border-bottom: 1px solid #e2e8f0;
+}
+
+.product-recommendations-icon {
+    font-size: 18px;
+    margin-right: 8px;
+}
+
+.product-recommendations-title {
+    font-weight: 600;
+    color: #334155;
+    font-size: 14px;
+    margin: 0;
+}
+
+.product-cards-grid {
+    display: flex;
+    flex-wrap: wrap;
+    gap: 12px;
+    align-items: stretch;
+}
+
+.product-card {
+    background: white;
+    border: 1px solid #e2e8f0;
+    border-radius: 8px;
+    padding: 10px 12px;
+    flex: 1;
+    min-width: 180px;
+    max-width: 250px;
+    box-shadow: 0 1px 4px rgba(0,0,0,0.05);
+    transition: all 0.2s ease;
+    display: flex;
+    align-items: center;
+}
+
+.product-card:hover {
+    transform: translateY(-1px);
+    box-shadow: 0 3px 8px rgba(0,0,0,0.1);
+    border-color: #007bff;
+}
+
+.product-card-content {
+    display: flex;
+    align-items: center;
+    justify-content: space-between;
+    width: 100%;
+    gap: 8px;
+}
+
+.product-info {
+    display: flex;
+    align-items: center;
+    flex: 1;
+    min-width: 0;
+}
+
+.product-icon {
+    font-size: 12px;
+    margin-right: 6px;
+    opacity: 0.7;
+    flex-shrink: 0;
+}
+
+.product-id {
+    font-family: 'SF Mono', 'Monaco', 'Consolas', monospace;
+    background: #f1f5f9;
+    padding: 2px 6px;
+    border-radius: 4px;
+    font-size: 10px;
+    color: #475569;
+    font-weight: 500;
+    letter-spacing: 0.3px;
+    white-space: nowrap;
+    overflow: hidden;
+    text-overflow: ellipsis;
+    flex: 1;
+}
+
+.product-link {
+    display: inline-flex;
+    align-items: center;
+    background: linear-gradient(135deg, #007bff 0%, #0056b3 100%);
+    color: white;
+    padding: 4px 8px;
+    border-radius: 4px;
+    text-decoration: none;
+    font-size: 10px;
+    font-weight: 500;
+    transition: all 0.2s ease;
+    white-space: nowrap;
+    flex-shrink: 0;
+}
+
+.product-link:hover {
+    transform: translateY(-1px);
+    box-shadow: 0 2px 6px rgba(0,123,255,0.3);
+    text-decoration: none;
+    color: white;
+    background: linear-gradient(135deg, #0056b3 0%, #004085 100%);
+}
+
+.product-link-icon {
+    font-size: 8px;
+    margin-right: 3px;
+}
+
+/* Responsive design for smaller screens */
+@media (max-width: 768px) {
+    .product-cards-grid {
+        flex-direction: column;
+    }
+    
+    .product-card {
+        max-width: none;
+    }
+    
+    .product-card-content {
+        flex-direction: column;
+        align-items: flex-start;
+    }
+    
+    .product-link {
+        align-self: stretch;
+        justify-content: center;
+    }
+}
+</style>
+""", flags=re.DOTALL)).strip()
 
 def show_chat_explorer(df):
     """Display the chat explorer interface"""
@@ -24,10 +334,9 @@ def show_chat_explorer(df):
         st.error(f"Missing required columns: {', '.join(missing_columns)}")
         return
     
-    # Filter by launch date (July 1, 2025) to latest
+    # Launch date (July 1, 2025) to latest; main() already dropped earlier rows
     min_date = pd.to_datetime('2025-07-01')
     max_date = df['timestamp'].max().normalize()
-    filtered_df = df[df['timestamp'] >= min_date]
     
     # Sidebar filters
     col1, col2, col3, col4 = st.columns(4)
@@ -39,62 +348,55 @@ def show_chat_explorer(df):
             max_value=max_date.date()
         )
     with col2:
-        region_filter = st.selectbox("Region", options=["All"] + sorted(filtered_df['region'].unique().tolist()))
+        region_filter = st.selectbox("Region", options=["All"] + sorted(df['region'].unique().tolist()))
     with col3:
         # Opening category filter
-        category_options = ["All", "Fragrance Help", "Skincare Routine", "Product Summarization", "Others"]
+        category_options = ["All"] + OPENING_CATEGORIES
         opening_category_filter = st.selectbox("Opening Category", options=category_options)
     with col4:
         time_filter = st.text_input("Time (HH:MM, optional)")
 
-    # Apply filters
-    if isinstance(date_filter, tuple) and len(date_filter) == 2:
-        filtered_df = filtered_df[(filtered_df['timestamp'].dt.date >= date_filter[0]) & (filtered_df['timestamp'].dt.date <= date_filter[1])]
-    
-    if region_filter != "All":
-        filtered_df = filtered_df[filtered_df['region'] == region_filter]
-    
-    if time_filter:
-        filtered_df = filtered_df[filtered_df['timestamp'].dt.strftime('%H:%M').str.contains(time_filter)]
-    
-    # Apply opening category filter - optimized with vectorized operations
-    if opening_category_filter != "All":
-        # Compute opening categories for all threads using vectorized operations
-        def compute_opening_category(group):
-            first_user_message = group[group['role'] == 'user'].sort_values('timestamp').head(1)
-            if not first_user_message.empty:
-                return categorize_opening_message(first_user_message.iloc[0]['message'])
-            return "Others"
-        
-        # Add opening category column to filtered_df
-        opening_categories = filtered_df.groupby('thread_id').apply(compute_opening_category)
-        filtered_df = filtered_df.merge(
-            opening_categories.reset_index().rename(columns={0: 'opening_category'}),
-            on='thread_id',
-            how='left'
-        )
-        
-        # Filter dataframe to only include matching conversations
-        filtered_df = filtered_df[filtered_df['opening_category'] == opening_category_filter]
-
     # Search and conversation selection
-    chats = filtered_df.groupby('thread_id').first().reset_index()
+    # Filtered conversation list, memoized on the filter values so reruns from the search box,
+    # paging or conversation selection don't refilter and regroup the whole frame
+    chats = _filter_chats(df, date_filter, region_filter, opening_category_filter, time_filter)
     search_term = st.text_input("Search in conversations (user/assistant/message)")
     
     if search_term:
-        mask = chats.apply(lambda row: search_term.lower() in str(row['thread_id']).lower() or 
-                          search_term.lower() in str(row['region']).lower() or 
-                          search_term.lower() in str(row['message']).lower(), axis=1)
+        # Column-wise substring scans instead of a per-row Python lambda; on the categorical
+        # keys .str runs once per distinct label, so no per-row string copies are made
+        mask = (
+            chats['thread_id'].str.contains(search_term, case=False, regex=False, na=False) |
+            chats['region'].str.contains(search_term, case=False, regex=False, na=False) |
+            chats['message'].str.contains(search_term, case=False, regex=False, na=False)
+        )
         chats = chats[mask]
     
-    chat_options = chats['thread_id'] + ' | ' + chats['timestamp'].dt.strftime('%Y-%m-%d %H:%M') + ' | ' + chats['region']
+    # Only send a window of options to the browser; the selectbox re-serializes them every rerun.
+    # The page size is stored with the filters it was grown for, so changing any filter starts over.
+    filter_key = (date_filter, region_filter, opening_category_filter, time_filter, search_term)
+    limit_key, options_limit = st.session_state.get("chat_options_limit", (filter_key, CHAT_OPTIONS_PAGE))
+    if limit_key != filter_key:
+        options_limit = CHAT_OPTIONS_PAGE
+        st.session_state["chat_options_limit"] = (filter_key, options_limit)
+    if len(chats) > options_limit:
+        st.caption(f"Showing {options_limit:,} of {len(chats):,} conversations. Use search to narrow them down.")
+        if st.button("Show more conversations", key="chat_show_more"):
+            st.session_state["chat_options_limit"] = (filter_key, options_limit + CHAT_OPTIONS_PAGE)
+            st.rerun()
+        chats = chats.head(options_limit)
+    
+    # One str.cat over the three label columns instead of chained '+' temporaries
+    chat_options = chats['thread_id'].astype(str).str.cat(
+        [chats['timestamp'].dt.strftime('%Y-%m-%d %H:%M'), chats['region'].astype(str)], sep=' | '
+    )
     selected_chat = st.selectbox("Select a conversation:", 
                                 chat_options if not chat_options.empty else ["No conversations found"])
     
     # Display selected conversation
     if selected_chat != "No conversations found":
         thread_id = selected_chat.split(' | ')[0]
-        thread_df = df[df['thread_id'] == thread_id].sort_values('timestamp')
+        thread_df = df.iloc[_thread_positions(df).get(thread_id, [])].sort_values('timestamp', kind='stable')
         
         # Get conversation metadata
         first_message = thread_df.iloc[0]
@@ -113,10 +415,10 @@ def show_chat_explorer(df):
         else:
             duration_str = "< 1s"
         
-        # Get opening category for this conversation
-        first_user_message = thread_df[thread_df['role'] == 'user']
+        # Get opening category for this conversation (same rule as the category filter)
+        first_user_message = _first_user_messages(thread_df)
         if len(first_user_message) > 0:
-            opening_category = categorize_opening_message(first_user_message.iloc[0]['message'])
+            opening_category = categorize_opening_message(first_user_message['message'].iloc[0])
         else:
             opening_category = "Others"
         
@@ -134,324 +436,117 @@ def show_chat_explorer(df):
         </div>
         """, unsafe_allow_html=True)
         
-        # Add custom CSS for chat bubbles
-        st.markdown("""
-        <style>
-        /* CSS Variables for light/dark mode support */
-        :root {
-            --background-color: white;
-            --text-color: #333;
-            --secondary-text-color: #666;
-            --border-color: #e0e0e0;
-            --code-background: #f5f5f5;
-            --code-text: #2d3748;
-            --code-border: #e2e8f0;
-        }
-        
-        /* Dark mode detection using Streamlit's theme */
-        @media (prefers-color-scheme: dark) {
-            :root {
-                --background-color: #262730;
-                --text-color: #fafafa;
-                --secondary-text-color: #a0a0a0;
-                --border-color: #404040;
-                --code-background: #1e1e1e;
-                --code-text: #e2e8f0;
-                --code-border: #404040;
-            }
-        }
-        
-        /* Streamlit dark mode override */
-        [data-theme="dark"] {
-            --background-color: #262730;
-            --text-color: #fafafa;
-            --secondary-text-color: #a0a0a0;
-            --border-color: #404040;
-            --code-background: #1e1e1e;
-            --code-text: #e2e8f0;
-            --code-border: #404040;
-        }
-        
-        .user-message {
-            background: #007bff;
-            color: white;
-            padding: 15px 20px;
-            border-radius: 20px 20px 5px 20px;
-            margin: 10px 0 10px 50px;
-            box-shadow: 0 2px 10px rgba(0, 123, 255, 0.2);
-            position: relative;
-            max-width: 100%;
-            word-wrap: break-word;
-        }
-        
-        .assistant-message {
-            background: #f1f3f4;
-            color: #333;
-            padding: 15px 20px;
-            border-radius: 20px 20px 20px 5px;
-            margin: 10px 50px 10px 0;
-            box-shadow: 0 2px 10px rgba(0, 0, 0, 0.1);
-            position: relative;
-            max-width: 80%;
-            word-wrap: break-word;
-            border: 1px solid #e0e0e0;
-        }
-        
-        .message-time {
-            font-size: 11px;
-            opacity: 0.7;
-            margin-bottom: 8px;
-            font-weight: 500;
-            letter-spacing: 0.5px;
-        }
-        
-        .assistant-message .message-time {
-            color: #666;
-        }
-        
-        .user-message .message-time {
-            color: rgba(255, 255, 255, 0.9);
-        }
-        
-        .message-content {
-            line-height: 1.6;
-            font-size: 14px;
-            font-weight: 400;
-        }
-        
-        .translate-btn {
-            background: rgba(0, 123, 255, 0.1);
-            border: 1px solid rgba(0, 123, 255, 0.3);
-            color: #007bff;
-            padding: 6px 12px;
-            border-radius: 16px;
-            font-size: 11px;
-            margin-top: 10px;
-            cursor: pointer;
-            transition: all 0.2s ease;
-        }
-        
-        .translate-btn:hover {
-            background: rgba(0, 123, 255, 0.2);
-            transform: translateY(-1px);
-        }
-        
-        .translation {
-            background: #f8f9fa;
-            border-radius: 10px;
-            padding: 10px 14px;
-            margin-top: 10px;
-            font-style: italic;
-            border-left: 4px solid #007bff;
-            font-size: 13px;
-            line-height: 1.5;
-            color: #333;
-        }
-        
-        .conversation-header {
-            background: linear-gradient(90deg, #667eea 0%, #764ba2 100%);
-            color: white;
-            padding: 15px 20px;
-            border-radius: 15px;
-            margin-bottom: 20px;
-            box-shadow: 0 4px 20px rgba(102, 126, 234, 0.3);
-        }
-        
-        .conversation-title {
-            font-size: 18px;
-            font-weight: 600;
-            margin: 0;
-        }
-        
-        .conversation-meta {
-            font-size: 15px;
-            opacity: 0.9;
-            margin-top: 5px;
-        }
-        
-        .product-recommendations {
-            margin: 15px 50px 15px 0;
-            background: linear-gradient(135deg, #f8f9fb 0%, #f1f4f8 100%);
-            border: 1px solid #e2e8f0;
-            border-radius: 12px;
-            padding: 16px;
-            box-shadow: 0 2px 12px rgba(0,0,0,0.08);
-        }
-        
-        .product-recommendations-header {
-            display: flex;
-            align-items: center;
-            margin-bottom: 12px;
-            padding-bottom: 8px;
-            border-bottom: 1px solid #e2e8f0;
-        }
-        
-        .product-recommendations-icon {
-            font-size: 18px;
-            margin-right: 8px;
-        }
-        
-        .product-recommendations-title {
-            font-weight: 600;
-            color: #334155;
-            font-size: 14px;
-            margin: 0;
-        }
-        
-        .product-cards-grid {
-            display: flex;
-            flex-wrap: wrap;
-            gap: 12px;
-            align-items: stretch;
-        }
-        
-        .product-card {
-            background: white;
-            border: 1px solid #e2e8f0;
-            border-radius: 8px;
-            padding: 10px 12px;
-            flex: 1;
-            min-width: 180px;
-            max-width: 250px;
-            box-shadow: 0 1px 4px rgba(0,0,0,0.05);
-            transition: all 0.2s ease;
-            display: flex;
-            align-items: center;
-        }
-        
-        .product-card:hover {
-            transform: translateY(-1px);
-            box-shadow: 0 3px 8px rgba(0,0,0,0.1);
-            border-color: #007bff;
-        }
-        
-        .product-card-content {
-            display: flex;
-            align-items: center;
-            justify-content: space-between;
-            width: 100%;
-            gap: 8px;
-        }
-        
-        .product-info {
-            display: flex;
-            align-items: center;
-            flex: 1;
-            min-width: 0;
-        }
-        
-        .product-icon {
-            font-size: 12px;
-            margin-right: 6px;
-            opacity: 0.7;
-            flex-shrink: 0;
-        }
-        
-        .product-id {
-            font-family: 'SF Mono', 'Monaco', 'Consolas', monospace;
-            background: #f1f5f9;
-            padding: 2px 6px;
-            border-radius: 4px;
-            font-size: 10px;
-            color: #475569;
-            font-weight: 500;
-            letter-spacing: 0.3px;
-            white-space: nowrap;
-            overflow: hidden;
-            text-overflow: ellipsis;
-            flex: 1;
-        }
-        
-        .product-link {
-            display: inline-flex;
-            align-items: center;
-            background: linear-gradient(135deg, #007bff 0%, #0056b3 100%);
-            color: white;
-            padding: 4px 8px;
-            border-radius: 4px;
-            text-decoration: none;
-            font-size: 10px;
-            font-weight: 500;
-            transition: all 0.2s ease;
-            white-space: nowrap;
-            flex-shrink: 0;
-        }
-        
-        .product-link:hover {
-            transform: translateY(-1px);
-            box-shadow: 0 2px 6px rgba(0,123,255,0.3);
-            text-decoration: none;
-            color: white;
-            background: linear-gradient(135deg, #0056b3 0%, #004085 100%);
-        }
-        
-        .product-link-icon {
-            font-size: 8px;
-            margin-right: 3px;
-        }
-        
-        /* Responsive design for smaller screens */
-        @media (max-width: 768px) {
-            .product-cards-grid {
-                flex-direction: column;
-            }
-            
-            .product-card {
-                max-width: none;
-            }
-            
-            .product-card-content {
-                flex-direction: column;
-                align-items: flex-start;
-            }
-            
-            .product-link {
-                align-self: stretch;
-                justify-content: center;
-            }
-        }
-        </style>
-        """, unsafe_allow_html=True)
-        
-        for _, row in thread_df.iterrows():
-            _display_message(row)
+        # Custom CSS for chat bubbles (re-sent each run: Streamlit drops elements a rerun doesn't emit)
+        st.markdown(CHAT_CSS, unsafe_allow_html=True)
+        
+        # Rows as lightweight namedtuples (iterrows would build a Series per message), walked twice below
+        thread_rows = list(thread_df.itertuples(index=False))
+        
+        # Every text in this thread that can be translated, fetched in one batched request
+        thread_texts = tuple(dict.fromkeys(
+            text for text in (_translatable_text(row) for row in thread_rows) if text
+        ))
+        translations = {}
+        if thread_texts and st.toggle("🔤 Show English translations", key="chat_show_translations"):
+            try:
+                translations = dict(zip(thread_texts, translate_batch(thread_texts)))
+            except Exception:
+                st.warning("Translation service unavailable, showing original messages.")
+        
+        # Render the whole thread as a single markdown block instead of one element per message
+        html_parts = [_render_message(row, translations) for row in thread_rows]
+        st.markdown("".join(html_parts), unsafe_allow_html=True)
     else:
         st.info("No conversations match the selected filters.")
 
-def _display_message(row):
-    """Display a single message with proper formatting"""
-    timestamp = row['timestamp']
-    role = row['role']
-    message = row['message']
+@st.cache_data(show_spinner=False, max_entries=16, hash_funcs={pd.DataFrame: df_fingerprint})
+def _filter_chats(df, date_filter, region_filter, opening_category_filter, time_filter):
+    """First row of every conversation matching the explorer filters, ordered by thread id"""
+    # Apply filters by AND-ing boolean masks, then slice the frame once
+    mask = np.ones(len(df), dtype=bool)
+    if isinstance(date_filter, tuple) and len(date_filter) == 2:
+        mask &= day_range_mask(df, date_filter[0], date_filter[1])
+    
+    if region_filter != "All":
+        mask &= category_mask(df['region'], region_filter)
+    
+    if time_filter:
+        if FULL_TIME_RE.fullmatch(time_filter):
+            # Exact HH:MM: compare the categorical's integer codes, no string matching at all
+            mask &= category_mask(df['hhmm'], time_filter)
+        else:
+            # Partial input (e.g. "14:3"): pattern match over the 1440 labels, mapped by code
+            mask &= df['hhmm'].str.contains(time_filter, na=False).to_numpy()
+    
+    filtered_df = df[mask]
+    
+    # Apply opening category filter: categorize each thread's first user message column-wise
+    if opening_category_filter != "All":
+        first_user = _first_user_messages(filtered_df)
+        categories = np.asarray(categorize_opening_messages(first_user['message']))
+        if opening_category_filter == "Others":
+            # Conversations without any user message count as 'Others' too
+            excluded = first_user['thread_id'][categories != "Others"]
+            filtered_df = filtered_df[~filtered_df['thread_id'].isin(excluded)]
+        else:
+            included = first_user['thread_id'][categories == opening_category_filter]
+            filtered_df = filtered_df[filtered_df['thread_id'].isin(included)]
+
+    # First row of each thread (the frame is already in time order) via a hashed distinct rather
+    # than a groupby aggregating every column; listed by thread id as before
+    return filtered_df.drop_duplicates(subset='thread_id').sort_values('thread_id', ignore_index=True)
+
+def _first_user_messages(df):
+    """Each thread's first user row (thread_id, message), used by both the category filter and
+    the conversation header. The frame is in time order, so this is a hashed distinct over the
+    user rows; an empty first message is kept (and categorizes as 'Others')."""
+    return df.loc[category_mask(df['role'], 'user'), ['thread_id', 'message']].drop_duplicates(subset='thread_id')
+
+@st.cache_resource(show_spinner=False, max_entries=4, hash_funcs={pd.DataFrame: df_fingerprint})
+def _thread_positions(df):
+    """Row positions of every thread, built once per dataset so selecting a conversation
+    is a dict lookup instead of a scan of the whole thread_id column"""
+    return df.groupby('thread_id', observed=True).indices
+
+def _translatable_text(row):
+    """Return the text of a message that would be translated, or None"""
+    if row.role == 'user':
+        return row.message if row.is_arabic else None
+    _, response_text = _parse_assistant_response(row.message)
+    text = response_text or row.message
+    return text if is_arabic(text) else None
+
+def _render_message(row, translations):
+    """Build the HTML for a single message with proper formatting"""
+    timestamp = row.timestamp
+    role = row.role
+    message = row.message
     
     # Format timestamp
     time_str = timestamp.strftime('%H:%M')
     relative_time = _format_relative_time(timestamp)
     
     if role == 'user':
-        _display_user_message(message, time_str, relative_time, row)
-    else:
-        _display_assistant_message(message, time_str, relative_time, row)
+        return _render_user_message(message, time_str, relative_time, translations)
+    return _render_assistant_message(message, time_str, relative_time, translations)
 
-def _display_user_message(message, time_str, relative_time, row):
-    """Display user message with chat bubble styling"""
+def _render_user_message(message, time_str, relative_time, translations):
+    """Build user message HTML with chat bubble styling"""
     # Clean the message
     clean_message = _clean_message_text(message)
     
-    message_html = f"""
-    <div class="user-message">
-        <div class="message-time">User • {time_str} • {relative_time}</div>
-        <div class="message-content">{clean_message}</div>
-    </div>
-    """
-    st.markdown(message_html, unsafe_allow_html=True)
+    message_html = (
+        f'<div class="user-message">'
+        f'<div class="message-time">User • {time_str} • {relative_time}</div>'
+        f'<div class="message-content">{clean_message}</div>'
+        f'</div>'
+    )
     
-    # Add translation button for Arabic messages
-    if is_arabic(message):
-        _add_translation_section(message, f"user_trans_{row.name}")
+    # Add translation for Arabic messages
+    return message_html + _render_translation(message, translations)
 
-def _display_assistant_message(message, time_str, relative_time, row):
-    """Display assistant message with chat bubble styling and JSON parsing"""
+def _render_assistant_message(message, time_str, relative_time, translations):
+    """Build assistant message HTML with chat bubble styling and JSON parsing"""
     # Try to parse JSON response
     recommendations, response_text = _parse_assistant_response(message)
     
@@ -463,86 +558,61 @@ def _display_assistant_message(message, time_str, relative_time, row):
         clean_response = _clean_message_text(message)
     
     # Build the message HTML (without inline recommendations)
-    message_html = f"""
-    <div class="assistant-message">
-        <div class="message-time">🤖 Layla Assistant • {time_str} • {relative_time}</div>
-        <div class="message-content">{clean_response}</div>
-    </div>
-    """
-    
-    st.markdown(message_html, unsafe_allow_html=True)
+    message_html = (
+        f'<div class="assistant-message">'
+        f'<div class="message-time">🤖 Layla Assistant • {time_str} • {relative_time}</div>'
+        f'<div class="message-content">{clean_response}</div>'
+        f'</div>'
+    )
     
     # Display recommendations as separate cards below the message
     if recommendations:
-        _display_product_recommendations(recommendations)
+        message_html += _render_product_recommendations(recommendations)
     
-    # Add translation button for Arabic messages
-    if is_arabic(response_text or message):
-        _add_translation_section(response_text or message, f"assistant_trans_{row.name}")
+    # Add translation for Arabic messages
+    return message_html + _render_translation(response_text or message, translations)
 
-def _display_product_recommendations(recommendations):
-    """Display product recommendations as compact cards using native Streamlit components"""
-    if not recommendations:
-        return
-    
-    rec_count = len(recommendations)
+def _render_product_recommendations(recommendations):
+    """Build product recommendation cards as HTML"""
+    product_ids = [product_id for product_id in recommendations if product_id]
+    if not product_ids:
+        return ""
     
-    # Create a container for the recommendations
-    with st.container():
-        # Header with smaller size (level 5)
-        st.markdown(f"##### {rec_count} Product Recommendation{'s' if rec_count > 1 else ''}")
-        
-        # Create columns for horizontal layout
-        # Calculate number of columns based on recommendations count (max 5 per row)
-        cols_per_row = min(len(recommendations), 5)
-        cols = st.columns(cols_per_row)
-        
-        for i, product_id in enumerate(recommendations):
-            if product_id:  # Only display if product_id is not empty
-                with cols[i % cols_per_row]:
-                    # Create a card-like appearance using markdown and styling
-                    product_link = f"https://www.faces.ae/en/search?q={product_id}&lang=en_AE"
-                    
-                    # Use a combination of markdown and button for the card
-                    st.markdown(f"""
-                    <div style="
-                        background: var(--background-color, white);
-                        border: 1px solid var(--border-color, #e0e0e0);
-                        border-radius: 8px;
-                        padding: 12px;
-                        margin-bottom: 8px;
-                        text-align: center;
-                        box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-                        color: var(--text-color, #333);
-                    ">
-                        <div style="
-                            font-size: 10px;
-                            color: var(--secondary-text-color, #666);
-                            margin-bottom: 4px;
-                            font-weight: 500;
-                            text-transform: uppercase;
-                            letter-spacing: 0.5px;
-                        ">Product ID</div>
-                        <div style="
-                            font-family: 'SF Mono', Monaco, Consolas, monospace;
-                            font-size: 11px;
-                            background: var(--code-background, #f5f5f5);
-                            color: var(--code-text, #2d3748);
-                            padding: 6px 8px;
-                            border-radius: 4px;
-                            margin-bottom: 8px;
-                            word-break: break-all;
-                            font-weight: 600;
-                            border: 1px solid var(--code-border, #e2e8f0);
-                        ">{product_id}</div>
-                    </div>
-                    """, unsafe_allow_html=True)
-                    
-                    # Use native Streamlit link button
-                    st.link_button("🔗 View Product", product_link, use_container_width=True)
+    rec_count = len(product_ids)
+    cards = "".join(
+        f'<div class="product-card"><div class="product-card-content">'
+        f'<div class="product-info"><span class="product-icon">🏷️</span>'
+        f'<span class="product-id">{product_id}</span></div>'
+        f'<a class="product-link" href="https://www.faces.ae/en/search?q={product_id}&lang=en_AE" target="_blank">'
+        f'<span class="product-link-icon">🔗</span>View Product</a>'
+        f'</div></div>'
+        for product_id in product_ids
+    )
+    return (
+        f'<div class="product-recommendations">'
+        f'<div class="product-recommendations-header">'
+        f'<span class="product-recommendations-icon">🛍️</span>'
+        f'<p class="product-recommendations-title">{rec_count} Product Recommendation{"s" if rec_count > 1 else ""}</p>'
+        f'</div>'
+        f'<div class="product-cards-grid">{cards}</div>'
+        f'</div>'
+    )
 
+def _render_translation(text, translations):
+    """Build the translation block for a message if one was fetched"""
+    translation = translations.get(text)
+    if not translation:
+        return ""
+    return (
+        f'<div class="translation">'
+        f'<strong>🔤 Translation:</strong><br>{_clean_message_text(translation)}'
+        f'</div>'
+    )
+
+@functools.lru_cache(maxsize=4096)
 def _parse_assistant_response(message):
-    """Parse JSON from assistant response to extract recommendations and response text"""
+    """Parse JSON from assistant response to extract recommendations and response text
+    (memoized per message string: reruns re-render the same thread; callers must not mutate the result)"""
     if not message or not message.strip():
         return [], message
     
@@ -588,27 +658,15 @@ def _parse_assistant_response(message):
             response_text = ""
             
             # More robust primary_id extraction
-            primary_id_patterns = [
-                r'"primary_id":\s*"([^"]+)"',
-                r'"primary_id":"([^"]+)"',
-                r'primary_id["\']?\s*:\s*["\']([^"\']+)["\']'
-            ]
-            
-            for pattern in primary_id_patterns:
-                matches = re.findall(pattern, original_message, re.IGNORECASE)
+            for pattern in PRIMARY_ID_RES:
+                matches = pattern.findall(original_message)
                 if matches:
                     recommendations = [match.strip() for match in matches if match.strip() and match.strip().lower() != 'null']
                     break
             
             # More robust response_text extraction
-            response_patterns = [
-                r'"response_text":\s*"(.*?)"(?=\s*[,}])',
-                r'"response_text":"(.*?)"(?=,"|\})',
-                r'response_text["\']?\s*:\s*["\']([^"\']*)["\']'
-            ]
-            
-            for pattern in response_patterns:
-                match = re.search(pattern, original_message, re.DOTALL | re.IGNORECASE)
+            for pattern in RESPONSE_TEXT_RES:
+                match = pattern.search(original_message)
                 if match:
                     response_text = match.group(1)
                     response_text = response_text.replace('\\n', '\n').replace('\\"', '"').replace('\\\\', '\\')
@@ -622,8 +680,9 @@ def _parse_assistant_response(message):
     
     return [], original_message
 
+@functools.lru_cache(maxsize=4096)
 def _clean_message_text(text):
-    """Clean and format message text for better display"""
+    """Clean and format message text for better display (memoized per message string)"""
     if not text:
         return ""
     
@@ -658,40 +717,24 @@ def _clean_message_text(text):
     text = text.replace('\n', '<br>')
     
     # Convert markdown-style formatting to HTML
-    text = re.sub(r'\*\*(.*?)\*\*', r'<strong>\1</strong>', text)
-    text = re.sub(r'### (.*?)(<br>|$)', r'<h4>\1</h4>', text)
-    text = re.sub(r'- \*\*(.*?)\*\*', r'<br>• <strong>\1</strong>', text)
+    text = BOLD_RE.sub(r'<strong>\1</strong>', text)
+    text = HEADER_RE.sub(r'<h4>\1</h4>', text)
+    text = BOLD_BULLET_RE.sub(r'<br>• <strong>\1</strong>', text)
     
     # Handle bullet points and lists
-    text = re.sub(r'^- (.*?)$', r'• \1', text, flags=re.MULTILINE)
-    text = re.sub(r'<br>- (.*?)(<br>|$)', r'<br>• \1\2', text)
+    text = LINE_BULLET_RE.sub(r'• \1', text)
+    text = BR_BULLET_RE.sub(r'<br>• \1\2', text)
     
     # Handle FAQ formatting
-    text = re.sub(r'FAQs?:\s*<br>', '<br><strong>FAQs:</strong><br>', text, flags=re.IGNORECASE)
+    text = FAQ_RE.sub('<br><strong>FAQs:</strong><br>', text)
     
     # Clean up multiple spaces and breaks
-    text = re.sub(r'\s+', ' ', text)
-    text = re.sub(r'(<br>\s*){3,}', '<br><br>', text)  # Limit consecutive breaks
+    text = WHITESPACE_RE.sub(' ', text)
+    text = REPEATED_BR_RE.sub('<br><br>', text)  # Limit consecutive breaks
     text = text.strip()
     
     return text
 
-def _add_translation_section(message, key):
-    """Add translation button and display for Arabic messages"""
-    col1, col2 = st.columns([1, 4])
-    with col1:
-        if st.button("🔤 Translate", key=key, help="Translate to English"):
-            st.session_state[f"{key}_translation"] = translate_text(message)
-    
-    # Display translation if it exists
-    if f"{key}_translation" in st.session_state:
-        translation = st.session_state[f"{key}_translation"]
-        st.markdown(f"""
-        <div class="translation">
-            <strong>🔤 Translation:</strong><br>{_clean_message_text(translation)}
-        </div>
-        """, unsafe_allow_html=True)
-
 def _format_relative_time(timestamp):
     """Format timestamp to relative time (e.g., '2 minutes ago', '1 hour ago')"""
     now = datetime.now()
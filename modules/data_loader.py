@@ -1,62 +1,260 @@
 """
 Data loading functions for the Layla Conversation Analyzer
 """
+import hashlib
+import io
+import logging
+import os
+import tempfile
+import time
+import certifi
 import streamlit as st
 import pandas as pd
+import numpy as np
 import ssl
+import stat
 import urllib.request
+from .utils import ARABIC_PATTERN, ANY_KEYWORD_PATTERN, KEYWORD_BITS, KEYWORD_PATTERNS
+
+# How long a downloaded dataset stays fresh, in memory and on disk
+CACHE_TTL_SECONDS = 3600
+
+# Column layout of the conversations export (the trailing column is unused)
+CSV_COLUMNS = ['thread_id', 'timestamp', 'role', 'message', 'region', 'extra']
+
+# Low-cardinality/repeated keys as categoricals: integer-code filters and groupbys
+CSV_DTYPES = {
+    'thread_id': 'category',
+    'role': 'category',
+    'region': 'category',
+    'message': 'str',
+    'extra': 'str',
+}
+
+# The export writes ISO-8601 timestamps ("2025-07-30 01:34:00.000000"); naming the format keeps
+# pandas on its vectorized ISO parser instead of guessing the layout
+TIMESTAMP_FORMAT = 'ISO8601'
+
+# Columns the tabs read: the export's five plus the ones derived in _prepare_dataframe
+FRAME_COLUMNS = CSV_COLUMNS[:5] + ['day', 'hhmm', 'is_arabic', 'word_count', 'is_blank', 'keyword_bits']
+
+# Every HH:MM label of the day, in order; position == minute of day
+HHMM_LABELS = [f"{h:02d}:{m:02d}" for h in range(24) for m in range(60)]
+
+# Every character str.split() treats as whitespace, spelled out because RE2 (which runs the
+# pattern on Arrow strings) matches only ASCII whitespace with \s
+UNICODE_WHITESPACE = "\t\n\x0b\x0c\r\x1c-\x1f \x85\xa0\u1680\u2000-\u200a\u2028\u2029\u202f\u205f\u3000"
+WORD_PATTERN = f"[^{UNICODE_WHITESPACE}]+"
+BLANK_PATTERN = f"[{UNICODE_WHITESPACE}]*"
+
+# Verifying TLS context built once and shared by every download
+SSL_CONTEXT = ssl.create_default_context(cafile=certifi.where())
 
 def load_data_from_url():
     """Load conversation data from the cloud storage URL"""
     try:
-        # Get the conversations URL from secrets
+        # Get the conversations URL from secrets (read outside the cache so the key stays stable)
         conversations_url = st.secrets["connections"]["supabase"]["CONVERSATIONS_URL"]
-        
-        # Create SSL context that doesn't verify certificates (for signed URLs)
-        ssl_context = ssl.create_default_context()
-        ssl_context.check_hostname = False
-        ssl_context.verify_mode = ssl.CERT_NONE
-        
-        # For HTTPS URLs, use urllib to handle SSL context properly
-        if conversations_url.startswith('https'):
-            # Create a custom opener with the SSL context
-            opener = urllib.request.build_opener(urllib.request.HTTPSHandler(context=ssl_context))
-            urllib.request.install_opener(opener)
-        
-        # Load CSV from URL (urllib opener handles SSL)
-        df = pd.read_csv(conversations_url, 
-                        header=None, 
-                        names=['thread_id', 'timestamp', 'role', 'message', 'region', 'extra'],
-                        usecols=range(5))
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        return df
+        return _fetch_conversations(conversations_url)
     except Exception as e:
         st.error(f"❌ Error loading data from URL: {e}")
         st.info("💡 Please check your cloud storage configuration")
         return None
 
+@st.cache_data(ttl=CACHE_TTL_SECONDS, show_spinner="Loading conversations…")
+def _fetch_conversations(conversations_url):
+    """Download and parse the conversations CSV, memoized across reruns.
+    The parsed frame is also persisted as Parquet so restarts skip the CSV parse."""
+    cache_path = _parquet_cache_path(conversations_url.encode())
+    df = _read_parquet_cache(cache_path)
+    if df is not None:
+        return df
+    
+    # For URLs, parse the response incrementally while it downloads; pyarrow's reader
+    # only understands local paths and buffers
+    if '://' in conversations_url:
+        with urllib.request.urlopen(conversations_url, context=SSL_CONTEXT, timeout=30) as response:
+            df = _stream_conversations_csv(response)
+    else:
+        df = _read_conversations_csv(conversations_url)
+    
+    df = _prepare_dataframe(df)
+    _write_parquet_cache(df, cache_path)
+    return df
+
+def _parquet_cache_path(source_key):
+    """Local Parquet file for a source, keyed by its URL or upload bytes (None if there's no usable cache dir)"""
+    cache_dir = _parquet_cache_dir()
+    if cache_dir is None:
+        return None
+    key = hashlib.sha1(source_key).hexdigest()[:16]
+    return os.path.join(cache_dir, f"conv_{key}.parquet")
+
+def _parquet_cache_dir():
+    """Private (0700) per-user cache directory under the system temp dir.
+    A directory owned by someone else or open to other users is never used."""
+    uid = os.getuid() if hasattr(os, 'getuid') else None
+    cache_dir = os.path.join(tempfile.gettempdir(), f"conversation-analyzer-{uid if uid is not None else 'cache'}")
+    try:
+        os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+        info = os.lstat(cache_dir)
+    except OSError as e:
+        logging.warning(f"Parquet cache disabled, cannot create {cache_dir}: {e}")
+        return None
+    is_private = stat.S_ISDIR(info.st_mode) and (uid is None or (info.st_uid == uid and not info.st_mode & 0o077))
+    if not is_private:
+        logging.warning(f"Parquet cache disabled, {cache_dir} is not a private directory")
+        return None
+    return cache_dir
+
+def _read_parquet_cache(path):
+    """Load only the app's columns from a fresh Parquet cache, or None to re-parse.
+    A cache written before a derived column existed fails the projection and is rebuilt."""
+    if path is None or not _is_fresh(path):
+        return None
+    try:
+        return pd.read_parquet(path, columns=FRAME_COLUMNS)
+    except Exception as e:
+        logging.warning(f"Ignoring unreadable Parquet cache {path}: {type(e).__name__}: {e}")
+        return None
+
+def _write_parquet_cache(df, path):
+    """Persist a prepared frame atomically (temp file + rename) and prune expired files;
+    failures only cost the next cold start"""
+    if path is None:
+        return
+    cache_dir = os.path.dirname(path)
+    tmp_path = None
+    try:
+        _prune_parquet_cache(cache_dir)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            df[FRAME_COLUMNS].to_parquet(f, compression='snappy')
+        os.replace(tmp_path, path)
+    except Exception as e:
+        logging.warning(f"Failed to write Parquet cache {path}: {type(e).__name__}: {e}")
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def _prune_parquet_cache(cache_dir):
+    """Delete cache files (and stray temp files) older than the TTL"""
+    for entry in os.scandir(cache_dir):
+        if entry.name.startswith('conv_') or entry.name.endswith('.tmp'):
+            if not _is_fresh(entry.path):
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+
+def _is_fresh(path):
+    """Whether a cache file exists and is younger than the TTL"""
+    try:
+        return time.time() - os.path.getmtime(path) < CACHE_TTL_SECONDS
+    except OSError:
+        return False
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, show_spinner="Loading conversations…")
 def load_data_from_csv(file_path):
     """Load data from local CSV file"""
-    df = pd.read_csv(file_path, header=None, names=[
-        'thread_id', 'timestamp', 'role', 'message', 'region', 'extra'
-    ], usecols=range(5))
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    return df
+    return _prepare_dataframe(_read_conversations_csv(file_path))
 
 def load_data_from_upload(uploaded_file):
     """Load data from uploaded CSV file"""
     try:
-        df = pd.read_csv(uploaded_file, 
-                       header=None, 
-                       names=['thread_id', 'timestamp', 'role', 'message', 'region', 'extra'],
-                       usecols=range(5))
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        return df
+        return _parse_uploaded_csv(uploaded_file.getvalue())
     except Exception as e:
         st.error(f"❌ Error reading CSV file: {e}")
         st.info("💡 Please ensure your CSV has the correct format: thread_id, timestamp, role, message, region")
         return None
 
+@st.cache_data(ttl=CACHE_TTL_SECONDS, show_spinner="Loading conversations…")
+def _parse_uploaded_csv(file_bytes):
+    """Parse uploaded CSV bytes, memoized so re-uploading the same file hits the cache.
+    Like the cloud source, the parsed frame is persisted as Parquet keyed by content."""
+    cache_path = _parquet_cache_path(file_bytes)
+    df = _read_parquet_cache(cache_path)
+    if df is not None:
+        return df
+    df = _prepare_dataframe(_read_conversations_csv(io.BytesIO(file_bytes)))
+    _write_parquet_cache(df, cache_path)
+    return df
+
+def _read_conversations_csv(source):
+    """Read a headerless conversations export into typed columns"""
+    try:
+        from pyarrow import csv as pa_csv
+    except ImportError:
+        # Fall back to the default C parser when pyarrow isn't installed
+        return pd.read_csv(source, header=None, names=CSV_COLUMNS, usecols=range(5),
+                           dtype=CSV_DTYPES, parse_dates=['timestamp'], date_format=TIMESTAMP_FORMAT)
+    # Arrow's multithreaded reader writes straight into typed buffers and never converts 'extra'
+    read_options, convert_options = _arrow_csv_options()
+    return pa_csv.read_csv(source, read_options=read_options, convert_options=convert_options).to_pandas()
+
+def _stream_conversations_csv(stream):
+    """Parse a conversations export block by block from a file-like stream.
+    Network reads overlap with parsing and only one raw block is buffered at a time."""
+    try:
+        from pyarrow import csv as pa_csv
+    except ImportError:
+        return _read_conversations_csv(io.BytesIO(stream.read()))
+    read_options, convert_options = _arrow_csv_options(block_size=8 << 20)
+    return pa_csv.open_csv(stream, read_options=read_options, convert_options=convert_options).read_all().to_pandas()
+
+def _arrow_csv_options(**read_kwargs):
+    """pyarrow CSV options for the export: the first five columns only, declared up front.
+    Dictionary-encoded keys come out of to_pandas() as categoricals, matching CSV_DTYPES;
+    the timestamp type is inferred, and anything Arrow can't parse is left to _prepare_dataframe."""
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+    keys = pa.dictionary(pa.int32(), pa.string())
+    read_options = pa_csv.ReadOptions(column_names=CSV_COLUMNS, **read_kwargs)
+    convert_options = pa_csv.ConvertOptions(
+        include_columns=CSV_COLUMNS[:5],
+        column_types={'thread_id': keys, 'role': keys, 'message': pa.string(), 'region': keys},
+        # Empty fields become missing values, as with pd.read_csv
+        strings_can_be_null=True,
+    )
+    return read_options, convert_options
+
+def _prepare_dataframe(df):
+    """Ensure timestamps are parsed and sorted, and derive per-message columns shared by every tab"""
+    if not pd.api.types.is_datetime64_any_dtype(df['timestamp']):
+        df['timestamp'] = pd.to_datetime(df['timestamp'], format=TIMESTAMP_FORMAT)
+    # Chronological order lets date cuts binary-search instead of building masks. Missing
+    # timestamps go last: searchsorted orders NaT after every date, so cuts can end before them.
+    if not df['timestamp'].is_monotonic_increasing:
+        df = df.sort_values('timestamp', kind='stable', na_position='last', ignore_index=True)
+    # Arrow dictionary-encodes keys in first-appearance order; sort the categories so ordering by
+    # thread id or region (which compares codes) is alphabetical
+    for column in ('thread_id', 'region'):
+        df[column] = df[column].cat.reorder_categories(sorted(df[column].cat.categories))
+    # Calendar day (still datetime64) and HH:MM label, derived once for filters and daily groupbys
+    df['day'] = df['timestamp'].dt.normalize()
+    # HH:MM as a categorical over the 1440 minutes of the day: built from integer codes rather than
+    # per-row strftime, and .str filters then run once per label instead of once per message
+    # (code -1, i.e. missing, for rows without a timestamp)
+    minute_of_day = (df['timestamp'].dt.hour * 60 + df['timestamp'].dt.minute).fillna(-1).astype('int16').to_numpy()
+    df['hhmm'] = pd.Categorical.from_codes(minute_of_day, categories=HHMM_LABELS)
+    # Vectorized Arabic detection, computed once instead of per-row is_arabic() calls
+    df['is_arabic'] = df['message'].str.contains(ARABIC_PATTERN, regex=True, na=False)
+    # Word count and whitespace-only flag, so the analytics reruns reduce plain arrays
+    # (words as str.split() sees them, Unicode spaces included)
+    df['word_count'] = df['message'].str.count(WORD_PATTERN).fillna(0).astype('int32')
+    df['is_blank'] = df['message'].str.fullmatch(BLANK_PATTERN, na=False)
+    df['keyword_bits'] = _keyword_bits(df['message'])
+    return df
+
+def _keyword_bits(messages):
+    """uint8 bitmask of the keyword classes (see KEYWORD_BITS) each message matches.
+    One scan of the full column with the union pattern; the per-class scans only touch the hits."""
+    bits = np.zeros(len(messages), dtype=np.uint8)
+    hits = messages.str.contains(ANY_KEYWORD_PATTERN, na=False).to_numpy()
+    hit_messages = messages[hits]
+    for name, pattern in KEYWORD_PATTERNS.items():
+        bits[hits] |= np.where(hit_messages.str.contains(pattern).to_numpy(), KEYWORD_BITS[name], 0).astype(np.uint8)
+    return bits
+
 def show_data_source_selection():
     """Show data source selection interface and return loaded dataframe"""
     st.subheader("📊 Data Source")
@@ -71,9 +269,13 @@ def show_data_source_selection():
     df = None
     
     if data_source == "Use Cloud Database":
-        st.info("🔄 Loading conversation data from cloud database...")
+        # Create a placeholder for loading message
+        loading_placeholder = st.empty()
+        loading_placeholder.info("🔄 Loading conversation data from cloud database...")
+        
         df = load_data_from_url()
         
+        loading_placeholder.empty()  # Clear loading message
         if df is None:
             st.error("❌ Failed to load conversation data from cloud database.")
             st.stop()
@@ -8,7 +8,8 @@ import plotly.express as px
 from datetime import timedelta
 import json
 import logging
-from deep_translator import GoogleTranslator
+from .utils import translate_batch, df_fingerprint, day_range_mask, category_mask
+from .data_loader import WORD_PATTERN
 
 
 def _compute_assistant_latencies(df: pd.DataFrame) -> pd.DataFrame:
@@ -35,10 +36,9 @@ def _compute_assistant_latencies(df: pd.DataFrame) -> pd.DataFrame:
             ]
         )
 
-    # Ensure proper types
-    df = df.copy()
+    # Ensure proper types (assign returns a new frame, so the caller's data is never modified)
     if not np.issubdtype(df["timestamp"].dtype, np.datetime64):
-        df["timestamp"] = pd.to_datetime(df["timestamp"], errors="coerce")
+        df = df.assign(timestamp=pd.to_datetime(df["timestamp"], format="ISO8601", errors="coerce"))
 
     # Keep only the needed columns
     expected_cols = {"thread_id", "timestamp", "role", "message", "region"}
@@ -50,14 +50,14 @@ def _compute_assistant_latencies(df: pd.DataFrame) -> pd.DataFrame:
     df = df.sort_values(["thread_id", "timestamp"]).reset_index(drop=True)
 
     rows = []
-    for thread_id, g in df.groupby("thread_id", sort=False):
+    for thread_id, g in df.groupby("thread_id", sort=False, observed=True):
         last_user_ts = None
         last_user_msg = None
         region = g["region"].iloc[0] if "region" in g.columns else "Unknown"
-        for _, r in g.iterrows():
-            role = r["role"]
-            ts = r["timestamp"]
-            msg = r["message"]
+        for r in g.itertuples(index=False):
+            role = r.role
+            ts = r.timestamp
+            msg = r.message
 
             if role == "user":
                 last_user_ts = ts
@@ -77,14 +77,38 @@ def _compute_assistant_latencies(df: pd.DataFrame) -> pd.DataFrame:
                                 "latency_timedelta": delta,
                                 "user_message": str(last_user_msg) if last_user_msg is not None else "",
                                 "assistant_message": str(msg) if msg is not None else "",
-                                "user_char_len": len(str(last_user_msg)) if last_user_msg is not None else 0,
-                                "user_word_len": len(str(last_user_msg).split()) if last_user_msg is not None else 0,
-                                "assistant_char_len": len(str(msg)) if msg is not None else 0,
                             }
                         )
                 # Do not reset last_user_ts; multiple assistant messages may respond to the same prompt
 
-    return pd.DataFrame(rows)
+    lat_df = pd.DataFrame(rows)
+    if lat_df.empty:
+        return lat_df
+    # Length columns in one vectorized pass each (word count without building token lists;
+    # WORD_PATTERN splits on Unicode whitespace like str.split(), which RE2's \S does not)
+    lat_df["user_char_len"] = lat_df["user_message"].str.len()
+    lat_df["user_word_len"] = lat_df["user_message"].str.count(WORD_PATTERN)
+    lat_df["assistant_char_len"] = lat_df["assistant_message"].str.len()
+    return lat_df
+
+
+def _filter_latency_frame(df: pd.DataFrame, start_date, end_date, region_filter: str) -> pd.DataFrame:
+    """Rows whose day falls within the selected date range (if any) and region."""
+    mask = np.ones(len(df), dtype=bool)
+    if start_date is not None:
+        mask &= day_range_mask(df, start_date, end_date)
+    if region_filter != "All":
+        mask &= category_mask(df["region"], region_filter)
+    return df[mask]
+
+
+@st.cache_data(show_spinner=False, max_entries=8, hash_funcs={pd.DataFrame: df_fingerprint})
+def _cached_assistant_latencies(df: pd.DataFrame, start_date, end_date, region_filter: str):
+    """Per-answer latencies and per-thread message counts for one filter selection, keyed by the
+    unfiltered frame and the filters, so a rerun never re-slices the full frame."""
+    df_f = _filter_latency_frame(df, start_date, end_date, region_filter)
+    per_thread_counts = df_f.groupby("thread_id", observed=True).size().rename("messages_count").reset_index()
+    return _compute_assistant_latencies(df_f), per_thread_counts
 
 
 def _format_seconds(s: float) -> str:
@@ -133,68 +157,19 @@ def _clean_assistant_message(msg) -> str:
         return str(msg)
 
 
-def _get_translator():
-    """Create or reuse a translator that auto-detects source language and translates to English."""
-    key = "_latency_translator_en"
-    if key not in st.session_state:
-        try:
-            st.session_state[key] = GoogleTranslator(source="auto", target="en")
-        except Exception as e:
-            logging.error(f"Failed to create GoogleTranslator: {type(e).__name__}: {e}")
-            st.session_state[key] = None
-    return st.session_state[key]
-
-
-def _get_translation_cache():
-    """A simple in-memory cache for translations in this session."""
-    key = "_latency_translation_cache"
-    if key not in st.session_state:
-        st.session_state[key] = {}
-    return st.session_state[key]
-
-
 def _translate_series(series: pd.Series, enabled: bool) -> pd.Series:
+    """Translate the distinct non-empty strings of a column in batched requests."""
     if not enabled:
         return series
-    translator = _get_translator()
-    if translator is None:
+    texts = tuple(dict.fromkeys(s for s in series.dropna().astype(str) if s.strip()))
+    if not texts:
         return series
-    cache = _get_translation_cache()
-
-    def _t(x):
-        if x is None or (isinstance(x, float) and pd.isna(x)):
-            return x
-        s = str(x)
-        if not s.strip():
-            return s
-        if s in cache:
-            return cache[s]
-        try:
-            translated = translator.translate(s)
-            cache[s] = translated
-            return translated
-        except Exception:
-            return s
-
-    return series.apply(_t)
-
-
-def _translate_text(s: str, enabled: bool) -> str:
-    if not enabled or not s:
-        return s
-    translator = _get_translator()
-    if translator is None:
-        return s
-    cache = _get_translation_cache()
-    if s in cache:
-        return cache[s]
     try:
-        translated = translator.translate(str(s))
-        cache[s] = translated
-        return translated
-    except Exception as e:
-        st.warning(f"Translation failed: {e}")
-        return s
+        translations = dict(zip(texts, translate_batch(texts)))
+    except Exception:
+        st.warning("Translation service unavailable, showing original messages.")
+        return series
+    return series.map(lambda x: translations.get(x, x))
 
 
 def show_latency_dashboard(df: pd.DataFrame):
@@ -247,18 +222,15 @@ def show_latency_dashboard(df: pd.DataFrame):
     with cold2:
         clean_json_enabled = st.checkbox("Clean assistant JSON to plain text", value=True, key="latency_clean_json_all")
 
-    # Apply filters
+    # Selected date range (filters are applied inside the cached computation)
     if isinstance(date_range, (list, tuple)) and len(date_range) == 2:
-        start_date, end_date = pd.to_datetime(date_range[0]), pd.to_datetime(date_range[1]) + pd.Timedelta(days=1) - pd.Timedelta(seconds=1)
-        df_f = df[(df["timestamp"] >= start_date) & (df["timestamp"] <= end_date)].copy()
+        start_date, end_date = date_range
     else:
-        df_f = df.copy()
-
-    if region_filter != "All":
-        df_f = df_f[df_f["region"] == region_filter]
+        start_date = end_date = None
 
-    # Compute latencies for the currently selected filters (date + region)
-    lat_df = _compute_assistant_latencies(df_f)
+    # Compute latencies for the currently selected filters (date + region); memoized so
+    # reruns triggered from other tabs or unrelated widgets skip the filter and the per-message loop
+    lat_df, per_thread_counts = _cached_assistant_latencies(df, start_date, end_date, region_filter)
 
     if lat_df.empty:
         st.info("No assistant replies found to compute latency.")
@@ -282,7 +254,7 @@ def show_latency_dashboard(df: pd.DataFrame):
     # "last 7 days vs previous 7 days" relative to the end of the selected date range.
     try:
         # Use the already filtered per-answer latency DataFrame
-        lat_df_trend = lat_df.copy()
+        lat_df_trend = lat_df
         avg_delta_val = None  # seconds
         med_delta_val = None  # seconds
         p95_delta_val = None  # seconds
@@ -417,7 +389,7 @@ def show_latency_dashboard(df: pd.DataFrame):
         sopt_assistant_msg = st.checkbox("Assistant message", value=True, key="latency_slow_opt_assistant_msg")
 
     # Build unified filtered dataframe
-    slow_df = lat_df.copy()
+    slow_df = lat_df
     if slow_only_critical:
         slow_df = slow_df[slow_df["latency_seconds"] >= float(critical_threshold_s)]
     if slow_min_latency and float(slow_min_latency) > 0:
@@ -442,10 +414,10 @@ def show_latency_dashboard(df: pd.DataFrame):
         if sopt_assistant_msg:
             display_cols.append("assistant_message_clean")
 
+        # Take the top rows first so only the displayed latencies get formatted
         slow_display = (
-            slow_df.assign(latency=lambda d: d["latency_seconds"].map(_format_seconds))
-            .sort_values("latency_seconds", ascending=False)
-            .head(int(slow_top_n))
+            slow_df.nlargest(int(slow_top_n), "latency_seconds")
+            .assign(latency=lambda d: d["latency_seconds"].map(_format_seconds))
             .loc[:, display_cols]
             .rename(
                 columns={
@@ -485,8 +457,8 @@ def show_latency_dashboard(df: pd.DataFrame):
             st.plotly_chart(fig, use_container_width=True)
             st.caption("Histogram: how many replies fall into each latency range. A long right tail indicates slow outliers.")
         with colc2:
-            lat_df["date"] = lat_df["assistant_timestamp"].dt.date
-            daily = lat_df.groupby("date")["latency_seconds"].agg(["count", "mean", "median"]).reset_index()
+            # Midnight-normalized datetime64 keys, no per-row Python date objects
+            daily = lat_df.groupby(lat_df["assistant_timestamp"].dt.normalize().rename("date"))["latency_seconds"].agg(["count", "mean", "median"]).reset_index()
             fig2 = px.line(
                 daily,
                 x="date",
@@ -507,8 +479,7 @@ def show_latency_dashboard(df: pd.DataFrame):
         "-1 = strong negative (faster replies with longer chats), 0 = no clear link, +1 = strong positive."
     )
 
-    # Per thread metrics
-    per_thread_counts = df_f.groupby("thread_id").size().rename("messages_count").reset_index()
+    # Per thread metrics (message counts come with the cached latencies)
     per_thread_assistant_lat = (
         lat_df.groupby("thread_id")["latency_seconds"].mean().rename("avg_latency_seconds").reset_index()
     )
@@ -525,7 +496,7 @@ def show_latency_dashboard(df: pd.DataFrame):
     with col_out2:
         st.caption("Outliers are points outside 1.5×IQR for average latency.")
 
-    plot_df = per_thread.copy()
+    plot_df = per_thread
     removed = 0
     if exclude_outliers and not plot_df.empty:
         q1 = plot_df["avg_latency_seconds"].quantile(0.25)
@@ -562,10 +533,10 @@ def show_latency_dashboard(df: pd.DataFrame):
         st.metric("Pearson correlation", f"{corr:.3f}")
         st.caption("Closer to -1 or +1 means a stronger relationship. Values near 0 mean little to no linear relationship.")
 
-    # Download helper
+    # Download helper (the CSV is only serialized when the button is clicked)
     st.download_button(
         label="📥 Download per-answer latency CSV",
-        data=lat_df.drop(columns=["latency_timedelta"]).to_csv(index=False),
+        data=lambda: lat_df.drop(columns=["latency_timedelta"]).to_csv(index=False),
         file_name="assistant_latency_per_answer.csv",
         mime="text/csv",
     )
@@ -3,36 +3,49 @@ Keyword Search functionality for the Layla Conversation Analyzer
 """
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
+import io
 import re
+from collections import Counter
 from datetime import datetime
-from .utils import is_arabic, translate_text, categorize_opening_message
+from .utils import translate_batch, category_mask
+
+# Word tokenizer for the word-frequency analysis, compiled once
+WORD_RE = re.compile(r'\b\w+\b')
+
+# Any regex metacharacter in a search keyword; keywords without one are matched literally
+REGEX_META_RE = re.compile(r'[.^$*+?()\[\]{}|\\]')
 
 def show_keyword_search(df):
     """Display the keyword search interface"""
     st.header("🔍 Keyword Search Across All Conversations")
     
-    # Filter by launch date (July 1, 2025) to latest
-    min_date = pd.to_datetime('2025-07-01')
-    filtered_df = df[df['timestamp'] >= min_date]
-    
-    # Search interface
-    col1, col2 = st.columns([3, 1])
-    with col1:
-        search_keyword = st.text_input("Enter keyword(s) to search across all messages:", 
-                                     placeholder="e.g., error, booking, payment, help")
-    with col2:
-        case_sensitive = st.checkbox("Case sensitive", value=False)
+    # main() already limits df to the launch date (July 1, 2025) onwards, so no second slice here
+    filtered_df = df
     
-    col3, col4, col5 = st.columns(3)
-    with col3:
-        role_filter = st.selectbox("Filter by sender:", ["All", "user", "assistant"])
-    with col4:
-        region_search_filter = st.selectbox("Filter by region:", 
-                                          ["All"] + sorted(filtered_df['region'].unique().tolist()))
-    with col5:
-        min_results = st.number_input("Max results:", min_value=10, max_value=1000, value=100, step=10)
+    # Search interface - inside a form so typing doesn't rerun the search on every keystroke
+    with st.form("kw_search"):
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            search_keyword = st.text_input("Enter keyword(s) to search across all messages:", 
+                                         placeholder="e.g., error, booking, payment, help")
+        with col2:
+            case_sensitive = st.checkbox("Case sensitive", value=False)
+        
+        col3, col4, col5 = st.columns(3)
+        with col3:
+            role_filter = st.selectbox("Filter by sender:", ["All", "user", "assistant"])
+        with col4:
+            region_search_filter = st.selectbox("Filter by region:", 
+                                              ["All"] + sorted(filtered_df['region'].unique().tolist()))
+        with col5:
+            min_results = st.number_input("Max results:", min_value=10, max_value=1000, value=100, step=10)
+        
+        st.form_submit_button("🔍 Search")
     
+    # Form widgets keep their last submitted values, so results persist across other interactions
+
     if search_keyword:
         _perform_search(filtered_df, search_keyword, case_sensitive, role_filter, 
                        region_search_filter, min_results)
@@ -41,23 +54,21 @@ def show_keyword_search(df):
 
 def _perform_search(df, search_keyword, case_sensitive, role_filter, region_filter, max_results):
     """Perform the actual search and display results"""
-    # Prepare search dataframe
-    search_df = df.copy()
+    # Combine all predicates into one boolean mask and slice once (no full-frame copy)
+    mask = np.ones(len(df), dtype=bool)
     
     # Apply filters
     if role_filter != "All":
-        search_df = search_df[search_df['role'] == role_filter]
+        mask &= category_mask(df['role'], role_filter)
     
     if region_filter != "All":
-        search_df = search_df[search_df['region'] == region_filter]
+        mask &= category_mask(df['region'], region_filter)
     
-    # Perform search
-    if case_sensitive:
-        mask = search_df['message'].str.contains(search_keyword, na=False)
-    else:
-        mask = search_df['message'].str.contains(search_keyword, case=False, na=False)
+    # Perform search: plain keywords take the literal substring scan, only patterns go through regex
+    uses_regex = REGEX_META_RE.search(search_keyword) is not None
+    mask &= df['message'].str.contains(search_keyword, case=case_sensitive, na=False, regex=uses_regex).to_numpy()
     
-    results = search_df[mask].copy()
+    results = df[mask]
     
     if len(results) > 0:
         _display_search_results(results, search_keyword, case_sensitive, max_results)
@@ -74,14 +85,20 @@ def _display_search_results(results, search_keyword, case_sensitive, max_results
     
     # Limit results for display
     if len(results) > max_results:
-        results_display = results.head(max_results)
-        st.warning(f"Showing first {max_results} results out of {len(results)} total matches")
+        # The frame is in ascending time order, so take the newest matches rather than the head
+        results_display = results.nlargest(max_results, 'timestamp')
+        st.warning(f"Showing the {max_results} most recent results out of {len(results)} total matches")
     else:
         results_display = results
     
     # Sort by timestamp (most recent first)
     results_display = results_display.sort_values('timestamp', ascending=False)
     
+    # Highlight matches for all displayed rows in one vectorized pass
+    results_display = results_display.assign(
+        highlighted=_highlight_search_term(results_display['message'], search_keyword, case_sensitive)
+    )
+    
     # Display results with highlighting
     st.subheader("Search Results")
     
@@ -89,10 +106,11 @@ def _display_search_results(results, search_keyword, case_sensitive, max_results
     _add_download_button(results, search_keyword)
     
     # Display results
-    _show_results_grouped_or_list(results_display, search_keyword, case_sensitive)
+    _show_results_grouped_or_list(results_display)
     
-    # Analysis charts
-    _show_search_analysis(results, search_keyword)
+    # Analysis charts (only built on request)
+    if st.checkbox("Show word analysis and timeline", value=False):
+        _show_search_analysis(results, search_keyword)
 
 def _show_search_summary(results):
     """Show summary statistics for search results"""
@@ -101,120 +119,147 @@ def _show_search_summary(results):
         st.metric("Total Matches", len(results))
     with col2:
         st.metric("Unique Conversations", results['thread_id'].nunique())
+    role_counts = results['role'].value_counts()
     with col3:
-        user_matches = len(results[results['role'] == 'user'])
-        st.metric("User Messages", user_matches)
+        st.metric("User Messages", int(role_counts.get('user', 0)))
     with col4:
-        assistant_matches = len(results[results['role'] == 'assistant'])
-        st.metric("Assistant Messages", assistant_matches)
+        st.metric("Assistant Messages", int(role_counts.get('assistant', 0)))
 
 def _add_download_button(results, search_keyword):
-    """Add download button for search results"""
-    csv_results = results[['thread_id', 'timestamp', 'role', 'message', 'region']].copy()
-    csv_results['timestamp'] = csv_results['timestamp'].dt.strftime('%Y-%m-%d %H:%M:%S')
-    csv_string = csv_results.to_csv(index=False)
+    """Add download button for search results (CSV is only built when clicked)"""
     st.download_button(
         label="📥 Download search results as CSV",
-        data=csv_string,
+        data=lambda: _results_to_csv(results),
         file_name=f"keyword_search_{search_keyword.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
         mime="text/csv"
     )
 
-def _show_results_grouped_or_list(results_display, search_keyword, case_sensitive):
+@st.cache_data(show_spinner=False, max_entries=8)
+def _results_to_csv(results):
+    """Serialize search results to CSV bytes"""
+    csv_results = results[['thread_id', 'timestamp', 'role', 'message', 'region']].copy()
+    csv_results['timestamp'] = csv_results['timestamp'].dt.strftime('%Y-%m-%d %H:%M:%S')
+    buffer = io.BytesIO()
+    csv_results.to_csv(buffer, index=False, lineterminator='\n')
+    return buffer.getvalue()
+
+def _show_results_grouped_or_list(results_display):
     """Show results either grouped by conversation or as a list"""
+    translations = _get_translations(results_display)
     if st.checkbox("Group by conversation", value=True):
-        _show_grouped_results(results_display, search_keyword, case_sensitive)
+        _show_grouped_results(results_display, translations)
     else:
-        _show_list_results(results_display, search_keyword, case_sensitive)
+        _show_list_results(results_display, translations)
+
+def _get_translations(results_display):
+    """Behind a single toggle, batch-translate every Arabic message being displayed"""
+    arabic_messages = tuple(dict.fromkeys(results_display.loc[results_display['is_arabic'], 'message']))
+    if not arabic_messages or not st.toggle("🔤 Show English translations", key="search_show_translations"):
+        return {}
+    try:
+        return dict(zip(arabic_messages, translate_batch(arabic_messages)))
+    except Exception:
+        st.warning("Translation service unavailable, showing original messages.")
+        return {}
 
-def _show_grouped_results(results_display, search_keyword, case_sensitive):
+def _show_grouped_results(results_display, translations):
     """Show results grouped by conversation"""
     for thread_id in results_display['thread_id'].unique():
         thread_results = results_display[results_display['thread_id'] == thread_id]
         thread_info = thread_results.iloc[0]
         
         with st.expander(f"💬 Conversation {thread_id} | {thread_info['region']} | {len(thread_results)} matches"):
-            for _, row in thread_results.iterrows():
-                _display_message_with_highlighting(row, search_keyword, case_sensitive)
+            # One markdown block per conversation rather than one element per message
+            html_parts = [_render_message_with_highlighting(row, translations) for row in thread_results.itertuples(index=False)]
+            st.markdown("\n\n".join(html_parts), unsafe_allow_html=True)
 
-def _show_list_results(results_display, search_keyword, case_sensitive):
+def _show_list_results(results_display, translations):
     """Show results as a list without grouping"""
-    for _, row in results_display.iterrows():
-        message = _highlight_search_term(row['message'], search_keyword, case_sensitive)
-        
-        role_color = "#1f77b4" if row['role'] == 'user' else "#ff7f0e"
-        st.markdown(f"""
-        <div style='border: 1px solid #ddd; border-radius: 8px; padding: 12px; margin: 8px 0; border-left: 4px solid {role_color};'>
-            <div style='display: flex; justify-content: between; align-items: center; margin-bottom: 8px;'>
-                <small style='color: #666;'><b>Conversation:</b> {row['thread_id']} | <b>Time:</b> {row['timestamp'].strftime('%Y-%m-%d %H:%M:%S')} | <b>Sender:</b> {row['role'].upper()} | <b>Region:</b> {row['region']}</small>
-            </div>
-            <div>{message}</div>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        _add_translation_button(row, f"search_trans_list_{row.name}")
-
-def _display_message_with_highlighting(row, search_keyword, case_sensitive):
-    """Display a single message with search term highlighting"""
-    message = _highlight_search_term(row['message'], search_keyword, case_sensitive)
-    
-    role_color = "#1f77b4" if row['role'] == 'user' else "#ff7f0e"
-    st.markdown(f"""
-    <div style='border-left: 4px solid {role_color}; padding-left: 12px; margin: 8px 0;'>
-        <small style='color: #666;'>{row['timestamp'].strftime('%Y-%m-%d %H:%M:%S')} | <b>{row['role'].upper()}</b></small><br>
-        {message}
-    </div>
-    """, unsafe_allow_html=True)
-    
-    _add_translation_button(row, f"search_trans_{row.name}")
-
-def _highlight_search_term(message, search_keyword, case_sensitive):
-    """Highlight search term in message"""
-    if case_sensitive:
-        return message.replace(search_keyword, f"**🔍{search_keyword}**")
-    else:
-        pattern = re.compile(re.escape(search_keyword), re.IGNORECASE)
-        return pattern.sub(f"**🔍{search_keyword}**", message)
+    html_parts = [_render_list_result(row, translations) for row in results_display.itertuples(index=False)]
+    st.markdown("\n\n".join(html_parts), unsafe_allow_html=True)
+
+def _render_list_result(row, translations):
+    """Build the HTML for a single result in the ungrouped list"""
+    message = row.highlighted
+    
+    role_color = "#1f77b4" if row.role == 'user' else "#ff7f0e"
+    return (
+        f"<div style='border: 1px solid #ddd; border-radius: 8px; padding: 12px; margin: 8px 0; border-left: 4px solid {role_color};'>"
+        f"<div style='display: flex; justify-content: between; align-items: center; margin-bottom: 8px;'>"
+        f"<small style='color: #666;'><b>Conversation:</b> {row.thread_id} | <b>Time:</b> {row.timestamp.strftime('%Y-%m-%d %H:%M:%S')} | <b>Sender:</b> {row.role.upper()} | <b>Region:</b> {row.region}</small>"
+        f"</div>"
+        f"<div>{message}</div>"
+        f"{_render_translation(row, translations)}"
+        f"</div>"
+    )
 
-def _add_translation_button(row, key):
-    """Add translation button for Arabic messages"""
-    if is_arabic(row['message']):
-        if st.button(f"Translate", key=key):
-            translation = translate_text(row['message'])
-            st.markdown(f"<span style='color:green; font-style:italic;'><b>Translation:</b> {translation}</span>", 
-                      unsafe_allow_html=True)
+def _render_message_with_highlighting(row, translations):
+    """Build the HTML for a single message with search term highlighting"""
+    message = row.highlighted
+    
+    role_color = "#1f77b4" if row.role == 'user' else "#ff7f0e"
+    return (
+        f"<div style='border-left: 4px solid {role_color}; padding-left: 12px; margin: 8px 0;'>"
+        f"<small style='color: #666;'>{row.timestamp.strftime('%Y-%m-%d %H:%M:%S')} | <b>{row.role.upper()}</b></small><br>"
+        f"{message}"
+        f"{_render_translation(row, translations)}"
+        f"</div>"
+    )
+
+def _highlight_search_term(messages, search_keyword, case_sensitive):
+    """Highlight search term across a Series of messages"""
+    # Compile once for the whole column instead of once per displayed row
+    pattern = re.compile(re.escape(search_keyword), 0 if case_sensitive else re.IGNORECASE)
+    replacement = f"**🔍{search_keyword}**".replace('\\', r'\\')
+    return messages.astype(str).str.replace(pattern, replacement, regex=True)
+
+def _render_translation(row, translations):
+    """Build the translation line for an Arabic message if one was fetched"""
+    translation = translations.get(row.message) if row.is_arabic else None
+    if not translation:
+        return ""
+    return f"<br><span style='color:green; font-style:italic;'><b>Translation:</b> {translation}</span>"
 
 def _show_search_analysis(results, search_keyword):
     """Show word analysis and timeline for search results"""
     # Word frequency analysis
     st.subheader("📊 Word Analysis in Search Results")
-    all_text = ' '.join(results['message'].astype(str))
-    words = re.findall(r'\b\w+\b', all_text.lower())
-    word_freq = pd.Series(words).value_counts().head(20)
+    # Count per message instead of concatenating every result into one giant string
+    word_counts = Counter(word for message in results['message'].dropna() for word in WORD_RE.findall(message.lower()))
+    word_freq = pd.Series(dict(word_counts.most_common(20)), dtype='int64')
     
     if not word_freq.empty:
-        fig_words = px.bar(
-            x=word_freq.values,
-            y=word_freq.index,
-            orientation='h',
-            title='Top 20 Most Frequent Words in Search Results',
-            labels={'x': 'Frequency', 'y': 'Words'}
-        )
-        fig_words.update_layout(height=600)
-        st.plotly_chart(fig_words, use_container_width=True)
+        st.plotly_chart(_make_word_freq_chart(word_freq), use_container_width=True)
     
     # Timeline of search results
     if len(results) > 1:
         st.subheader("📅 Timeline of Search Results")
-        timeline_data = results.groupby(results['timestamp'].dt.date).size().reset_index(name='count')
-        fig_timeline = px.line(
-            timeline_data, 
-            x='timestamp', 
-            y='count',
-            title=f"Daily frequency of '{search_keyword}' mentions",
-            labels={'timestamp': 'Date', 'count': 'Number of mentions'}
-        )
-        st.plotly_chart(fig_timeline, use_container_width=True)
+        timeline_data = results.groupby('day').size().reset_index(name='count')
+        st.plotly_chart(_make_timeline_chart(timeline_data, search_keyword), use_container_width=True)
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _make_word_freq_chart(word_freq):
+    """Horizontal bar chart of the most frequent words (cached on the small counts Series)"""
+    fig_words = px.bar(
+        x=word_freq.values,
+        y=word_freq.index,
+        orientation='h',
+        title='Top 20 Most Frequent Words in Search Results',
+        labels={'x': 'Frequency', 'y': 'Words'}
+    )
+    fig_words.update_layout(height=600)
+    return fig_words
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _make_timeline_chart(timeline_data, search_keyword):
+    """Daily mentions line chart (cached on the per-day counts)"""
+    return px.line(
+        timeline_data, 
+        x='day', 
+        y='count',
+        title=f"Daily frequency of '{search_keyword}' mentions",
+        labels={'day': 'Date', 'count': 'Number of mentions'}
+    )
 
 def _show_search_tips():
     """Show tips for better search results"""
@@ -1,21 +1,282 @@
 """
 Utility functions for the Layla Conversation Analyzer
 """
+import hashlib
 import re
+import time
+import streamlit as st
 import pandas as pd
-from deep_translator import GoogleTranslator
+import numpy as np
+
+# Arabic Unicode block (non-raw so the pattern holds literal characters, which
+# both Python re and the pyarrow string kernels accept)
+ARABIC_PATTERN = '[\u0600-\u06FF]'
+
+# The same block as code points, for scalar checks without the regex engine
+_ARABIC_CODEPOINTS = frozenset(chr(c) for c in range(0x0600, 0x0700))
+
+# Keyword patterns for the error/sentiment metrics, compiled once and matched case-insensitively.
+# On the Arrow-backed message column pandas hands these to pyarrow's RE2 (DFA) kernels; keep them
+# to plain alternations with no flag other than IGNORECASE, or matching silently falls back to
+# Python's re row by row.
+ERROR_PATTERN = re.compile('error|failed|exception|problem|issue', re.IGNORECASE)
+HAPPY_PATTERN = re.compile('thank|great|awesome|perfect|amazing|love|happy|helpful|👍', re.IGNORECASE)
+FRUSTRATED_PATTERN = re.compile('not working|bad|hate|angry|frustrated|annoy|useless|waste|problem|issue|disappoint|😡|😠|👎', re.IGNORECASE)
+# Union of the three, used to find the (few) messages worth checking against each one.
+# The classes overlap ("problem", "issue"), so they can't share one alternation for counting.
+ANY_KEYWORD_PATTERN = re.compile('|'.join(p.pattern for p in (ERROR_PATTERN, HAPPY_PATTERN, FRUSTRATED_PATTERN)), re.IGNORECASE)
+
+# Bit set in the precomputed 'keyword_bits' column for each keyword class
+KEYWORD_BITS = {'error': 1, 'happy': 2, 'frustrated': 4}
+KEYWORD_PATTERNS = {'error': ERROR_PATTERN, 'happy': HAPPY_PATTERN, 'frustrated': FRUSTRATED_PATTERN}
+
+# Labels returned by categorize_opening_message, in display order
+OPENING_CATEGORIES = ['Fragrance Help', 'Skincare Routine', 'Product Summarization', 'Others']
 
 def is_arabic(text):
     """Simple check for Arabic characters"""
-    return bool(re.search(r'[\u0600-\u06FF]', str(text)))
+    return not _ARABIC_CODEPOINTS.isdisjoint(str(text))
+
+def df_fingerprint(df):
+    """Cheap cache key for a DataFrame (shape, columns, timestamp span and a digest of the
+    thread ids) so st.cache_data doesn't hash every cell on each rerun"""
+    if df.empty or 'timestamp' not in df.columns:
+        return (df.shape, tuple(df.columns))
+    return (df.shape, tuple(df.columns), df['timestamp'].min(), df['timestamp'].max(), _thread_digest(df))
+
+def _thread_digest(df):
+    """Digest of the thread_id column, so a corrected re-upload with the same shape and span
+    doesn't reuse cached results. For a categorical only the integer codes are hashed, plus the
+    size and ends of the (sorted) categories."""
+    if 'thread_id' not in df.columns:
+        return None
+    thread_ids = df['thread_id']
+    if not isinstance(thread_ids.dtype, pd.CategoricalDtype):
+        return hashlib.sha1(pd.util.hash_pandas_object(thread_ids, index=False).to_numpy()).hexdigest()
+    categories = thread_ids.cat.categories
+    codes = np.ascontiguousarray(thread_ids.cat.codes.to_numpy())
+    bounds = (categories[0], categories[-1]) if len(categories) else ()
+    return (hashlib.sha1(codes).hexdigest(), len(categories), *bounds)
+
+def day_range_mask(df, start_date, end_date):
+    """Boolean NumPy mask for rows whose 'day' falls within [start_date, end_date]"""
+    days = df['day'].to_numpy()
+    return (days >= np.datetime64(start_date)) & (days <= np.datetime64(end_date))
+
+def day_range_slice(df, start_date, end_date):
+    """Rows whose 'day' falls within [start_date, end_date] as a positional slice.
+    Relies on the load-time sort by timestamp (missing ones last), so the bounds are two
+    binary searches and no mask or copy is built."""
+    start = df['day'].searchsorted(pd.Timestamp(start_date), side='left')
+    end = df['day'].searchsorted(pd.Timestamp(end_date), side='right')
+    return df.iloc[start:end]
+
+def category_mask(series, value):
+    """Boolean NumPy mask for ``series == value``, comparing integer codes when categorical"""
+    if not isinstance(series.dtype, pd.CategoricalDtype):
+        return (series == value).to_numpy()
+    categories = series.cat.categories
+    if value not in categories:
+        return np.zeros(len(series), dtype=bool)
+    return series.cat.codes.to_numpy() == categories.get_loc(value)
 
 def translate_text(text):
     """Translate text to English using GoogleTranslator"""
     try:
-        return GoogleTranslator(source='auto', target='en').translate(text)
+        return _translate_text_cached(text)
     except Exception:
         return "[Translation failed]"
 
+@st.cache_data(ttl=86400, max_entries=10000, show_spinner=False)
+def _translate_text_cached(text):
+    """Memoized translation request; errors propagate so failures aren't cached"""
+    return _google_translate(text)
+
+# Attempts per request when Google answers 429, with exponential backoff between them
+TRANSLATE_ATTEMPTS = 3
+
+def _get_translator():
+    """Fresh GoogleTranslator client (auto-detect -> English) for a single request.
+
+    Not shared: translate() mutates per-instance URL params, and the client holds
+    no HTTP session, so a shared instance would be racy and save nothing.
+    """
+    from deep_translator import GoogleTranslator
+    return GoogleTranslator(source='auto', target='en')
+
+def _google_translate(text):
+    """Send one translation request, backing off and retrying when rate limited"""
+    from deep_translator.exceptions import TooManyRequests
+    for attempt in range(TRANSLATE_ATTEMPTS):
+        try:
+            return _get_translator().translate(text)
+        except TooManyRequests:
+            if attempt == TRANSLATE_ATTEMPTS - 1:
+                raise
+            time.sleep(2 ** attempt)
+
+# Separator used to pack several messages into a single translation request
+BATCH_SEPARATOR = "\n-----\n"
+_BATCH_SPLIT_RE = re.compile(r'\s*-{5}\s*')
+
+# deep-translator rejects payloads longer than 5000 characters
+MAX_BATCH_CHARS = 4500
+
+def translate_batch(messages):
+    """
+    Translate a tuple of messages to English using as few requests as possible.
+    
+    Messages are joined with a separator, sent in chunks below the request size
+    limit, and split back apart. Messages too long to pack, and chunks whose
+    separators don't survive the round trip, are translated one by one; a message
+    that fails on its own keeps its original text (and the failure isn't cached).
+    Packed chunks and single messages are memoized separately for a day.
+    
+    Args:
+        messages (tuple[str, ...]): Messages to translate
+        
+    Returns:
+        tuple[str, ...]: Translations aligned with the input
+    
+    Raises:
+        TooManyRequests: If Google keeps rate limiting a packed request; callers
+            should catch it and fall back to the original text
+    """
+    translations = []
+    chunk, chunk_len = [], 0
+    for message in messages:
+        if len(message) + len(BATCH_SEPARATOR) > MAX_BATCH_CHARS:
+            # Too long to share a request: skip packing and go straight to the per-message path
+            translations.extend(_translate_chunk(tuple(chunk)))
+            translations.extend(_translate_each([message]))
+            chunk, chunk_len = [], 0
+            continue
+        if chunk and chunk_len + len(message) + len(BATCH_SEPARATOR) > MAX_BATCH_CHARS:
+            translations.extend(_translate_chunk(tuple(chunk)))
+            chunk, chunk_len = [], 0
+        chunk.append(message)
+        chunk_len += len(message) + len(BATCH_SEPARATOR)
+    translations.extend(_translate_chunk(tuple(chunk)))
+    return tuple(translations)
+
+def _translate_chunk(chunk):
+    """Translate one packed chunk, splitting it into per-message requests if packing doesn't apply.
+    Rate limiting propagates rather than turning into one rate-limited request per message."""
+    from deep_translator.exceptions import TooManyRequests
+    if len(chunk) > 1:
+        try:
+            parts = _translate_packed(chunk)
+        except TooManyRequests:
+            raise
+        except Exception:
+            parts = None
+        if parts is not None:
+            return list(parts)
+    return _translate_each(chunk)
+
+@st.cache_data(ttl=86400, max_entries=1000, show_spinner=False)
+def _translate_packed(chunk):
+    """Memoized joined request for a chunk, or None if the separators were mangled;
+    request errors propagate so failures aren't cached"""
+    joined = _google_translate(BATCH_SEPARATOR.join(chunk))
+    parts = _BATCH_SPLIT_RE.split(joined.strip()) if joined else []
+    return tuple(parts) if len(parts) == len(chunk) else None
+
+def _translate_each(messages):
+    """Per-message fallback: a message whose request fails keeps its original text.
+    Once Google rate limits, the remaining messages aren't requested at all."""
+    from deep_translator.exceptions import TooManyRequests
+    translations = []
+    for i, message in enumerate(messages):
+        try:
+            translations.append(_translate_text_cached(message))
+        except TooManyRequests:
+            translations.extend(messages[i:])
+            break
+        except Exception:
+            translations.append(message)
+    return translations
+
+# Opening-message patterns per category (English and Arabic), matched against the
+# stripped, lowercased message; earlier categories win
+_FRAGRANCE_PATTERNS = [
+    # English patterns
+    r"can you help me find the perfect fragrance",
+    r"help me find.*fragrance",
+    r"help me find.*perfume", 
+    r"find.*perfect fragrance",
+    r"find.*perfect perfume",
+    # Arabic patterns  
+    r"هل يمكنك مساعدتي في العثور على العطر المثالي",
+    r"مساعدتي.*العطر",
+    r"العثور على.*العطر",
+    r"ترشيح.*عطر",
+    r"اختيار.*عطر",  
+    r"برفيوم", 
+    r"عطر ثابت", 
+    r"اختيار عطر",
+]
+
+_SKINCARE_PATTERNS = [
+    # English patterns
+    r"define a 7-step skincare routine",
+    r"define.*skincare routine",
+    r"7-step skincare routine",
+    r"skincare routine.*7.*step",
+    r"create.*skincare routine",
+    r"routine.*skin",
+    # Arabic patterns
+    r"حدد روتينًا مكونًا من 7 خطوات للعناية بالبشرة",
+    r"حدد روتين.*للعناية بالبشرة.*7.*خطوات",
+    r"حدد.*روتين.*العناية بالبشرة",
+    r"روتين.*العناية بالبشرة.*7.*خطوات",
+    r"روتين.*بشرة",
+    r"العناية بالبشرة.*روتين",
+    r"روتين بشرة", 
+    r"نصائح بشرة"
+]
+
+_SUMMARIZATION_PATTERNS = [
+    # English patterns
+    r"summarize the product details",
+    r"summarize.*product.*details",
+    r"summarize.*key details.*product",
+    r"summarize.*following product",
+    r"summarize.*product.*using.*name.*description",
+    r"summarize.*key details.*following product",
+    r"product details.*name and description",
+    r"write.*customer questions.*answers",
+    r"product.*name.*description.*questions",
+    r"key details.*product.*name.*description",
+    r"details.*product.*provided name",
+    r"details.*following product.*name.*description",
+    r"customer questions",
+    # Arabic patterns
+    r"اذكر تفاصيل المنتج التالي",
+    r"تفاصيل المنتج.*الاسم والوصف", 
+    r"أنشئ.*أسئلة.*للعملاء",
+    r"المنتج.*الاسم.*الوصف.*أسئلة",
+    r"تفاصيل.*المنتج.*المُقدّمين",
+    r"لخص.*تفاصيل.*المنتج",
+    r"تفاصيل.*المنتج التالي.*الاسم.*الوصف",
+    r"معلومات المنتج.*اسم.*وصف",
+    r"كتابة.*أسئلة.*عن المنتج",
+    r"اعطني تفاصيل المنتج", 
+    r"معلومات عن المنتج"
+]
+
+OPENING_PATTERNS = {
+    'Fragrance Help': _FRAGRANCE_PATTERNS,
+    'Skincare Routine': _SKINCARE_PATTERNS,
+    'Product Summarization': _SUMMARIZATION_PATTERNS,
+}
+
+# Each category's patterns as one alternation, for the column-wide classifier
+_OPENING_CATEGORY_RES = {
+    category: re.compile('|'.join(f'(?:{p})' for p in patterns), re.IGNORECASE)
+    for category, patterns in OPENING_PATTERNS.items()
+}
+
 def categorize_opening_message(message):
     """
     Categorize conversation opening messages into predefined categories.
@@ -38,84 +299,30 @@ def categorize_opening_message(message):
     # Clean the message for comparison
     clean_message = str(message).strip().lower()
     
-    # Define categorization patterns (English and Arabic)
-    fragrance_patterns = [
-        # English patterns
-        r"can you help me find the perfect fragrance",
-        r"help me find.*fragrance",
-        r"help me find.*perfume", 
-        r"find.*perfect fragrance",
-        r"find.*perfect perfume",
-        # Arabic patterns  
-        r"هل يمكنك مساعدتي في العثور على العطر المثالي",
-        r"مساعدتي.*العطر",
-        r"العثور على.*العطر",
-        r"ترشيح.*عطر",
-        r"اختيار.*عطر",  
-        r"برفيوم", 
-        r"عطر ثابت", 
-        r"اختيار عطر",
-    ]
-    
-    skincare_patterns = [
-        # English patterns
-        r"define a 7-step skincare routine",
-        r"define.*skincare routine",
-        r"7-step skincare routine",
-        r"skincare routine.*7.*step",
-        r"create.*skincare routine",
-        r"routine.*skin",
-        # Arabic patterns
-        r"حدد روتينًا مكونًا من 7 خطوات للعناية بالبشرة",
-        r"حدد روتين.*للعناية بالبشرة.*7.*خطوات",
-        r"حدد.*روتين.*العناية بالبشرة",
-        r"روتين.*العناية بالبشرة.*7.*خطوات",
-        r"روتين.*بشرة",
-        r"العناية بالبشرة.*روتين",
-        r"روتين بشرة", 
-        r"نصائح بشرة"
-    ]
-    
-    summarization_patterns = [
-        # English patterns
-        r"summarize the product details",
-        r"summarize.*product.*details",
-        r"summarize.*key details.*product",
-        r"summarize.*following product",
-        r"summarize.*product.*using.*name.*description",
-        r"summarize.*key details.*following product",
-        r"product details.*name and description",
-        r"write.*customer questions.*answers",
-        r"product.*name.*description.*questions",
-        r"key details.*product.*name.*description",
-        r"details.*product.*provided name",
-        r"details.*following product.*name.*description",
-        r"customer questions",
-        # Arabic patterns
-        r"اذكر تفاصيل المنتج التالي",
-        r"تفاصيل المنتج.*الاسم والوصف", 
-        r"أنشئ.*أسئلة.*للعملاء",
-        r"المنتج.*الاسم.*الوصف.*أسئلة",
-        r"تفاصيل.*المنتج.*المُقدّمين",
-        r"لخص.*تفاصيل.*المنتج",
-        r"تفاصيل.*المنتج التالي.*الاسم.*الوصف",
-        r"معلومات المنتج.*اسم.*وصف",
-        r"كتابة.*أسئلة.*عن المنتج",
-        r"اعطني تفاصيل المنتج", 
-        r"معلومات عن المنتج"
-    ]
-    
     # Check each category
-    for pattern in fragrance_patterns:
-        if re.search(pattern, clean_message, re.IGNORECASE):
-            return "Fragrance Help"
-            
-    for pattern in skincare_patterns:
-        if re.search(pattern, clean_message, re.IGNORECASE):
-            return "Skincare Routine"
-            
-    for pattern in summarization_patterns:
-        if re.search(pattern, clean_message, re.IGNORECASE):
-            return "Product Summarization"
+    for category, patterns in OPENING_PATTERNS.items():
+        for pattern in patterns:
+            if re.search(pattern, clean_message, re.IGNORECASE):
+                return category
     
     return "Others"
+
+def categorize_opening_messages(messages):
+    """
+    Vectorized categorize_opening_message over a Series of messages.
+    
+    Runs one column scan per category (each category's patterns joined into a single
+    alternation) instead of one Python call and a re.search per pattern for each message.
+    
+    Args:
+        messages (pd.Series): Opening messages
+        
+    Returns:
+        pd.Categorical: Category per message, over OPENING_CATEGORIES
+    """
+    clean_messages = messages.str.strip().str.lower()
+    categories = np.full(len(messages), "Others", dtype=object)
+    # Lowest priority first, so earlier categories overwrite later ones
+    for category in reversed(list(_OPENING_CATEGORY_RES)):
+        categories[clean_messages.str.contains(_OPENING_CATEGORY_RES[category], na=False).to_numpy()] = category
+    return pd.Categorical(categories, categories=OPENING_CATEGORIES)